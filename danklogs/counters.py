@@ -0,0 +1,171 @@
+import asyncio
+import contextlib
+import logging
+
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, List, Tuple, Union
+
+from redbot.core import Config
+
+from .transactions import Transaction, TransactionLog
+
+log = logging.getLogger("red.andycogs.danklogs")
+
+
+class MemberDelta:
+    __slots__ = ("counts", "nested")
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.nested: Dict[str, Counter] = {}
+
+
+class CounterBuffer:
+    """Share and gift counters that are written to Config in batches
+
+    Changes are added up per member and flushed every ``interval`` seconds or
+    once ``max_events`` shares/gifts came in, whichever is first. A flush reads
+    each touched member once and only writes the keys that changed, instead of
+    reading and writing both whole member blobs on every share. The log
+    entries go to the transaction log in the same flush.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        transactions: TransactionLog,
+        interval: int = 15,
+        max_events: int = 50,
+    ):
+        self.config = config
+        self.transactions = transactions
+        self.interval = interval
+        self.max_events = max_events
+        self._pending: Dict[Tuple[int, int], MemberDelta] = {}
+        self._records: List[Transaction] = []
+        self._events = 0
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._stopping = asyncio.Event()
+        self._flush_task = None
+        self.stats = {"events": 0, "flushes": 0, "members": 0, "writes": 0}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _delta(self, guild_id: int, member_id: int) -> MemberDelta:
+        key = (guild_id, member_id)
+        delta = self._pending.get(key)
+        if delta is None:
+            delta = self._pending[key] = MemberDelta()
+        return delta
+
+    def add(self, guild_id: int, member_id: int, key: str, amount: int) -> None:
+        self._delta(guild_id, member_id).counts[key] += amount
+
+    def add_to(self, guild_id: int, member_id: int, key: str, subkey: str, amount: int) -> None:
+        delta = self._delta(guild_id, member_id)
+        delta.nested.setdefault(key, Counter())[subkey] += amount
+
+    def unflushed(self, guild_id: int, key: str) -> Dict[int, Union[int, Counter]]:
+        """Copies of the ``key`` changes per member of a guild not flushed yet"""
+        changes = {}
+        for (g, member_id), delta in self._pending.items():
+            if g != guild_id:
+                continue
+            if key in delta.nested:
+                changes[member_id] = Counter(delta.nested[key])
+            elif key in delta.counts:
+                changes[member_id] = delta.counts[key]
+        return changes
+
+    def record(self, transaction: Transaction) -> None:
+        self._records.append(transaction)
+
+    def event(self) -> None:
+        """Mark one share/gift as recorded, flushing early if enough piled up"""
+        self.stats["events"] += 1
+        self._events += 1
+        if self._events >= self.max_events and (
+            self._flush_task is None or self._flush_task.done()
+        ):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self) -> None:
+        async with self._lock:
+            await self._flush()
+
+    @asynccontextmanager
+    async def paused(self):
+        """Hold off flushes until the block is done, without flushing first"""
+        async with self._lock:
+            yield
+
+    @asynccontextmanager
+    async def flushed(self):
+        """Flush, then hold off further flushes until the block is done
+
+        Used to read a snapshot of the member data that won't change under
+        the reader, changes made in the meantime stay in ``unflushed``.
+        """
+        async with self._lock:
+            await self._flush()
+            yield
+
+    async def _flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        records, self._records = self._records, []
+        self._events = 0
+        if not pending and not records:
+            return
+        self.stats["flushes"] += 1
+        try:
+            await self.transactions.append(records)
+        except Exception:
+            log.exception("Couldn't save %s dank log transactions", len(records))
+        for (guild_id, member_id), delta in pending.items():
+            try:
+                await self._write(guild_id, member_id, delta)
+            except Exception:
+                log.exception("Couldn't save dank logs for member %s", member_id)
+
+    async def _write(self, guild_id: int, member_id: int, delta: MemberDelta) -> None:
+        group = self.config.member_from_ids(guild_id, member_id)
+        data = await group.all()
+        self.stats["members"] += 1
+
+        for key, amount in delta.counts.items():
+            await group.get_attr(key).set(data[key] + amount)
+            self.stats["writes"] += 1
+        for key, amounts in delta.nested.items():
+            values = data[key]
+            for subkey, amount in amounts.items():
+                values[subkey] = values.get(subkey, 0) + amount
+            await group.get_attr(key).set(values)
+            self.stats["writes"] += 1
+
+    async def _run(self) -> None:
+        # never cancelled, a flush cut off halfway would lose the deltas it
+        # already took out of the buffer
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> asyncio.Task:
+        """Stop the flush loop and start one last flush"""
+        self._stopping.set()
+        task, self._task = self._task, None
+        return asyncio.create_task(self._close(task))
+
+    async def _close(self, task) -> None:
+        if task is not None:
+            with contextlib.suppress(Exception):
+                await task
+        await self.flush()
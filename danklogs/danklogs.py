@@ -24,19 +24,38 @@ SOFTWARE.
 
 import asyncio
 import discord
-import contextlib
 import re
 import stringcase
+import time
 import unicodedata
 
-from datetime import datetime
-from rapidfuzz import process
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timezone
 from redbot.core import commands, Config
+from redbot.core.data_manager import cog_data_path
 from redbot.core.utils.chat_formatting import pagify
-from redbot.core.utils.menus import DEFAULT_CONTROLS, menu
+from redbot.core.utils.menus import DEFAULT_CONTROLS, menu, next_page, prev_page
 from typing import Optional
 from unidecode import unidecode
 
+from .counters import CounterBuffer
+from .leaderboard import LeaderboardIndex
+from .names import NameIndex
+from .transactions import Transaction, TransactionLog
+from .values import ItemValues
+
+DANK_MEMER_ID = 270904126974590976
+# how many recent pls commands are kept per channel, and for how many channels
+RECENT_COMMANDS = 5
+RECENT_CHANNELS = 2000
+# dank memer answers within a few seconds, a command older than this isn't
+# what a "You gave" message is answering
+COMMAND_MAX_AGE = 60
+
+LOGS_PAGE_SIZE = 10
+# the date at the start of log lines from before the transaction log
+legacy_log_date = re.compile(r"^(?:At|On) (\w{3}, \d{2} \w{3} \d{4} \d{2}:\d{2}:\d{2})")
+
 gift_regex = re.compile(
     r"You gave (?P<user>.*?[a-zA-Z0-9_]{2,32})  ?(?P<amount>[0-9,]+) ?(?:(?P<item>[a-zA-Z0-9_]{2,32}))?"
 )
@@ -133,10 +152,75 @@ class DankLogs(commands.Cog):
         self.config.register_member(**default_member)
         self.config.register_channel(**default_channel)
 
+        self.share_leaderboards = LeaderboardIndex(self.load_shared)
+        self.recent_commands = OrderedDict()
+        self.command_lookup_stats = {"hits": 0, "misses": 0}
+        self.name_indexes = {}
+        self.name_index_locks = {}
+        self.item_values = {}
+        self.item_value_locks = {}
+        self.item_value_pending = {}
+        self.transactions = TransactionLog(cog_data_path(self) / "transactions.db")
+        self.counters = CounterBuffer(self.config, self.transactions)
+        self.counters.start()
+
+    def cog_unload(self):
+        self.counters.stop().add_done_callback(lambda _: self.transactions.close())
+
+    async def cog_before_invoke(self, ctx):
+        # commands read member data straight from Config
+        await self.counters.flush()
+
+    async def load_shared(self, guild: discord.Guild) -> dict:
+        async with self.counters.flushed():
+            # shares from here on are either still in the buffer or queued on
+            # the leaderboard index, neither is in what's read from Config
+            self.share_leaderboards.reset_pending(guild.id)
+            unflushed = self.counters.unflushed(guild.id, "shared")
+            members = await self.config.all_members(guild)
+        shared = {int(member_id): data["shared"] for member_id, data in members.items()}
+        for member_id, amount in unflushed.items():
+            shared[member_id] = shared.get(member_id, 0) + amount
+        return shared
+
+    async def get_shared(self, member: discord.Member) -> int:
+        """How many coins a member has shared, including shares not flushed yet"""
+        # no flush may move the buffered shares into Config between the reads
+        async with self.counters.paused():
+            shared = await self.config.member(member).shared()
+            return shared + self.counters.unflushed(member.guild.id, "shared").get(
+                member.id, 0
+            )
+
     def comma_format(self, number: int):
         return "{:,}".format(int(number))
 
+    def remember_command(self, message: discord.Message):
+        channel_id = message.channel.id
+        recent = self.recent_commands.get(channel_id)
+        if recent is None:
+            recent = self.recent_commands[channel_id] = deque(maxlen=RECENT_COMMANDS)
+            if len(self.recent_commands) > RECENT_CHANNELS:
+                self.recent_commands.popitem(last=False)
+        else:
+            self.recent_commands.move_to_end(channel_id)
+        recent.append(message)
+
     async def get_last_message(self, message: discord.Message):
+        """Find the pls command a dank memer message is answering
+
+        Commands seen in the channel are checked first, the channel history is
+        only fetched when none of them fit, like after a reload.
+        """
+        for m in reversed(self.recent_commands.get(message.channel.id, ())):
+            if m.id >= message.id:
+                continue
+            if (message.created_at - m.created_at).total_seconds() > COMMAND_MAX_AGE:
+                break
+            self.command_lookup_stats["hits"] += 1
+            return m
+
+        self.command_lookup_stats["misses"] += 1
         async for m in message.channel.history(before=message, limit=5):
             if m.author.bot:
                 continue
@@ -172,32 +256,73 @@ class DankLogs(commands.Cog):
                     return True
         return False
 
+    async def get_name_index(self, guild: discord.Guild) -> NameIndex:
+        index = self.name_indexes.get(guild.id)
+        if index is not None:
+            return index
+        async with self.name_index_locks.setdefault(guild.id, asyncio.Lock()):
+            if guild.id in self.name_indexes:
+                return self.name_indexes[guild.id]
+            index = NameIndex(self.decode_cancer_name)
+            for i, member in enumerate(guild.members):
+                index.add(member.id, member.name)
+                if i % 5000 == 4999:
+                    await asyncio.sleep(0)  # don't hold the loop on huge guilds
+            for member_id, data in (await self.config.all_members(guild)).items():
+                if data["storedname"]:
+                    index.store(data["storedname"], int(member_id))
+            self.name_indexes[guild.id] = index
+            return index
+
+    async def get_item_values(self, guild: discord.Guild) -> ItemValues:
+        index = self.item_values.get(guild.id)
+        if index is not None:
+            return index
+        async with self.item_value_locks.setdefault(guild.id, asyncio.Lock()):
+            if guild.id in self.item_values:
+                return self.item_values[guild.id]
+            async with self.counters.flushed():
+                # gifts from here on are either still in the buffer or queued
+                # up in pending, neither is in what's read from Config
+                pending = self.item_value_pending[guild.id] = []
+                unflushed = {
+                    "gifted": self.counters.unflushed(guild.id, "gifted"),
+                    "receiveditems": self.counters.unflushed(guild.id, "receiveditems"),
+                }
+                try:
+                    prices = await self.config.guild(guild).itemvalues()
+                    members = await self.config.all_members(guild)
+                finally:
+                    del self.item_value_pending[guild.id]
+
+            items = {}
+            for key in ("gifted", "receiveditems"):
+                items[key] = {int(m): Counter(data[key]) for m, data in members.items()}
+                for member_id, counts in unflushed[key].items():
+                    items[key].setdefault(member_id, Counter()).update(counts)
+            index = ItemValues(prices, items["gifted"], items["receiveditems"])
+            for func, args in pending:
+                func(index, *args)
+            self.item_values[guild.id] = index
+            return index
+
+    def update_item_values(self, guild_id: int, func, *args) -> None:
+        index = self.item_values.get(guild_id)
+        if index is not None:
+            func(index, *args)
+        elif guild_id in self.item_value_pending:
+            self.item_value_pending[guild_id].append((func, args))
+
     async def get_fuzzy_member(self, ctx, name):
-        user = discord.utils.get(ctx.guild.members, name=name)
-        if user:
+        index = await self.get_name_index(ctx.guild)
+        member_id = index.resolve(name)
+        if member_id is None:
+            return None
+        user = ctx.guild.get_member(member_id)
+        if user and index.stored.get(name) != user.id:
+            index.store(name, user.id)
             await self.config.member(user).storedname.set(name)
-            return user
-        all_users = await self.config.all_members(ctx.guild)
-
-        for user, data in all_users.items():
-            user = ctx.guild.get_member(int(user))
-            if not user:
-                continue
-            if data["storedname"] == name:
-                return user
-
-        result = []
-        for r in process.extract(
-            name,
-            {m: self.decode_cancer_name(m.name) for m in ctx.guild.members},
-            limit=None,
-            score_cutoff=75,
-        ):
-            result.append((r[2], r[1]))
-
-            sorted_result = sorted(result, key=lambda r: r[1], reverse=True)
-            await self.config.member(sorted_result[0][0]).storedname.set(name)
-            return sorted_result[0][0]
+        return user
 
     @commands.group(aliases=["dls"])
     @commands.mod_or_permissions(manage_guild=True)
@@ -215,6 +340,29 @@ class DankLogs(commands.Cog):
             await self.config.guild(ctx.guild).channel.set(channel.id)
             await ctx.send(f"I will now log actions to {channel.mention}")
 
+    @danklogset.command(name="stats")
+    @commands.is_owner()
+    async def danklogset_stats(self, ctx):
+        """See how often share/gift commands were found without fetching history"""
+        stats = self.command_lookup_stats
+        lookups = stats["hits"] + stats["misses"]
+        counters = self.counters.stats
+        await ctx.send(
+            "Commands found in memory: {0}\nHistory fetches: {1}\nHit rate: {2}%\nChannels tracked: {3}\n"
+            "Shares/gifts recorded: {4}\nFlushes: {5}\nMember reads: {6}\nKey writes: {7} "
+            "(was {8} member reads and writes before batching)".format(
+                stats["hits"],
+                stats["misses"],
+                round(stats["hits"] / lookups * 100, 1) if lookups else 0,
+                len(self.recent_commands),
+                counters["events"],
+                counters["flushes"],
+                counters["members"],
+                counters["writes"],
+                counters["events"] * 2,
+            )
+        )
+
     @danklogset.command(aliases=["itemprice"])
     async def itemvalue(self, ctx, item: str, price: int):
         item_values = await self.config.guild(ctx.guild).itemvalues()
@@ -222,6 +370,7 @@ class DankLogs(commands.Cog):
             return await ctx.send("This item does not exist")
         item_values[item] = price
         await self.config.guild(ctx.guild).itemvalues.set(item_values)
+        self.update_item_values(ctx.guild.id, ItemValues.set_price, item, price)
         await ctx.send(f"Done. The price for **{item}** is now **{price}**")
 
     @commands.group(aliases=["dankstats"], invoke_without_command=True)
@@ -361,42 +510,30 @@ class DankLogs(commands.Cog):
     @dankinfo.command()
     async def receivedamount(self, ctx, user: Optional[discord.Member] = None):
         """View the price of the items you have received, the list is from a custom list and can be changed using `[p]danklogset itemprice <item> <price>`"""
-        total_amount = 0
         if not user:
             user = ctx.author
 
-        item_prices = await self.config.guild(ctx.guild).itemvalues()
-        received = await self.config.member(user).receiveditems()
-
-        if not received:
+        index = await self.get_item_values(ctx.guild)
+        if not index.has("received", user.id):
             return await ctx.send("You haven't received any items")
-        with contextlib.suppress(KeyError):
-            for item, amount in received.items():
-                total_amount += amount * item_prices[item]
         return await ctx.send(
             "You have received **{}** worth of items in **{}**".format(
-                self.comma_format(total_amount), ctx.guild.name
+                self.comma_format(index.total("received", user.id)), ctx.guild.name
             )
         )
 
     @dankinfo.command()
     async def giftedamount(self, ctx, user: Optional[discord.Member] = None):
         """View the price of the items you have given, the list is from a custom list and can be changed using `[p]danklogset itemprice <item> <price>`"""
-        total_amount = 0
         if not user:
             user = ctx.author
 
-        item_prices = await self.config.guild(ctx.guild).itemvalues()
-        gifted = await self.config.member(user).gifted()
-
-        if not gifted:
+        index = await self.get_item_values(ctx.guild)
+        if not index.has("gifted", user.id):
             return await ctx.send("You haven't gifted out anything")
-        with contextlib.suppress(KeyError):
-            for item, amount in gifted.items():
-                total_amount += amount * item_prices[item]
         return await ctx.send(
             "You have shared **{}** worth of items in **{}**".format(
-                self.comma_format(total_amount), ctx.guild.name
+                self.comma_format(index.total("gifted", user.id)), ctx.guild.name
             )
         )
 
@@ -473,51 +610,111 @@ class DankLogs(commands.Cog):
             )
             await ctx.send(embed=e)
 
+    def format_transaction(self, transaction: Transaction) -> str:
+        if transaction.kind == "legacy":
+            return transaction.note
+        when = datetime.utcfromtimestamp(transaction.timestamp).strftime(
+            "%a, %d %b %Y %H:%M:%S"
+        )
+        amount = self.comma_format(transaction.amount)
+        other = f"<@{transaction.counterparty}>"
+        if transaction.kind == "shared":
+            return f"At {when}, {amount} was shared to {other} in <#{transaction.channel_id}>"
+        elif transaction.kind == "received":
+            return f"At {when}, {amount} was received from {other} in <#{transaction.channel_id}>"
+        elif transaction.kind == "gifted":
+            return f"On {when}, {amount} {transaction.item} was sent to {other}"
+        return f"On {when}, {other} gave {amount} {transaction.item}"
+
+    async def migrate_logs(self, member: discord.Member) -> None:
+        """Move a members old log lines out of Config into the transaction log"""
+        legacy = await self.config.member(member).logs()
+        if not legacy:
+            return
+        now = time.time()
+        records = []
+        for line in legacy:
+            match = legacy_log_date.match(line)
+            try:
+                timestamp = (
+                    datetime.strptime(match.group(1), "%a, %d %b %Y %H:%M:%S")
+                    .replace(tzinfo=timezone.utc)
+                    .timestamp()
+                )
+            except (AttributeError, ValueError):
+                timestamp = now
+            records.append(
+                Transaction(
+                    member.guild.id, member.id, "legacy", None, 0, None, None, timestamp, line
+                )
+            )
+        await self.transactions.append(records)
+        await self.config.member(member).logs.clear()
+
     @dankinfo.command()
     @commands.mod_or_permissions(manage_guild=True)
-    async def logs(self, ctx, user: Optional[discord.Member] = None):
+    async def logs(self, ctx, user: Optional[discord.Member] = None, days: Optional[int] = None):
+        """View the shares and gifts of a user, newest first. Pass days to only see the last few days"""
         if not user:
             user = ctx.author
 
-        logs = await self.config.member(user).logs()
+        await self.migrate_logs(user)
+        since = time.time() - days * 86400 if days else None
+        total = await self.transactions.count(ctx.guild.id, user.id, since)
 
-        if len(logs) == 0:
+        if total == 0:
             return await ctx.send("This user has no logs to show")
 
-        logs = "\n\n".join(logs[::-1])
+        page_count = -(-total // LOGS_PAGE_SIZE)
 
-        if len(logs) >= 2048:
-            pages = list(pagify(logs))
-            embeds = []
-            for i, p in enumerate(pages, start=1):
-                e = discord.Embed(
-                    title=f"Logs for {user}",
-                    description=p,
-                    color=await ctx.embed_color(),
-                )
-                e.set_footer(text=f"Page {i} out of {len(pages)} pages")
-                embeds.append(e)
-            await menu(ctx, embeds, DEFAULT_CONTROLS)
-        else:
-            await ctx.send(
-                embed=discord.Embed(
-                    title=f"Logs for {user}",
-                    description=logs,
-                    color=await ctx.embed_color(),
-                )
+        async def render(page: int) -> discord.Embed:
+            transactions = await self.transactions.fetch(
+                ctx.guild.id,
+                user.id,
+                limit=LOGS_PAGE_SIZE,
+                offset=page * LOGS_PAGE_SIZE,
+                since=since,
+            )
+            e = discord.Embed(
+                title=f"Logs for {user}",
+                description="\n\n".join(map(self.format_transaction, transactions))[:2048],
+                color=await ctx.embed_color(),
             )
+            e.set_footer(text=f"Page {page + 1} out of {page_count} pages")
+            return e
 
-    @dankinfo.command(aliases=["mostshared"])
-    async def topshared(self, ctx, amount: int = 10):
-        """View the people in the server that have shared the most COINS"""
-        member_data = await self.config.all_members(ctx.guild)
-        member_list = [
-            (member, data["shared"])
-            for member, data in member_data.items()
-            if data["shared"] > 0 and ctx.guild.get_member(int(member)) is not None
-        ]
-        ordered_list = sorted(member_list, key=lambda m: m[1], reverse=True)[:amount]
+        first = await render(0)
+        if page_count == 1:
+            return await ctx.send(embed=first)
+
+        # menu wants every page up front, the rest stay placeholders until
+        # they are flipped to
+        pages = [first]
+        for page in range(1, page_count):
+            e = discord.Embed(
+                title=f"Logs for {user}", description="Loading...", color=first.color
+            )
+            e.set_footer(text=f"Page {page + 1} out of {page_count} pages")
+            pages.append(e)
+        rendered = {0}
+
+        async def turn_page(ctx, pages, controls, message, page, timeout, emoji):
+            step = 1 if DEFAULT_CONTROLS[emoji] is next_page else -1
+            target = (page + step) % len(pages)
+            if target not in rendered:
+                pages[target] = await render(target)
+                rendered.add(target)
+            return await DEFAULT_CONTROLS[emoji](
+                ctx, pages, controls, message, page, timeout, emoji
+            )
+
+        controls = {
+            emoji: turn_page if func in (next_page, prev_page) else func
+            for emoji, func in DEFAULT_CONTROLS.items()
+        }
+        await menu(ctx, pages, controls)
 
+    async def send_leaderboard(self, ctx, title: str, ordered_list: list):
         if not ordered_list:
             return await ctx.send("I have no tracked data for this server")
 
@@ -533,7 +730,7 @@ class DankLogs(commands.Cog):
             embeds = []
             for i, page in enumerate(pages, start=1):
                 e = discord.Embed(
-                    title=f"Share Leaderboard for {ctx.guild}",
+                    title=title,
                     description=page,
                     color=await ctx.embed_color(),
                 )
@@ -545,15 +742,62 @@ class DankLogs(commands.Cog):
         else:
             await ctx.send(
                 embed=discord.Embed(
-                    title=f"Share Leaderboard for {ctx.guild}",
+                    title=title,
                     description=leaderboard,
                     color=await ctx.embed_color(),
                 )
             )
 
+    @dankinfo.command(aliases=["mostshared"])
+    async def topshared(self, ctx, amount: int = 10):
+        """View the people in the server that have shared the most COINS"""
+        leaderboard = await self.share_leaderboards.get(ctx.guild)
+        ordered_list = leaderboard.top(amount, keep=ctx.guild.get_member)
+        await self.send_leaderboard(ctx, f"Share Leaderboard for {ctx.guild}", ordered_list)
+
+    @dankinfo.command(aliases=["mostgifted"])
+    async def topgifted(self, ctx, amount: int = 10):
+        """View the people in the server that have gifted the most items by value, the prices can be changed using `[p]danklogset itemprice <item> <price>`"""
+        index = await self.get_item_values(ctx.guild)
+        ordered_list = index.gifted_board.top(amount, keep=ctx.guild.get_member)
+        await self.send_leaderboard(ctx, f"Gift Leaderboard for {ctx.guild}", ordered_list)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        index = self.name_indexes.get(member.guild.id)
+        if index is not None:
+            index.add(member.id, member.name)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if before.name == after.name:
+            return
+        index = self.name_indexes.get(after.guild.id)
+        if index is not None:
+            index.add(after.id, after.name)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before: discord.User, after: discord.User):
+        # username changes come through here, not per guild
+        if before.name == after.name:
+            return
+        for index in self.name_indexes.values():
+            if after.id in index.names:
+                index.add(after.id, after.name)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        index = self.name_indexes.get(member.guild.id)
+        if index is not None:
+            index.remove(member.id)
+
     @commands.Cog.listener()
     async def on_message_without_command(self, message):
-        if not message.author.id == 270904126974590976:
+        if not message.guild:
+            return
+        if not message.author.id == DANK_MEMER_ID:
+            if not message.author.bot and message.content[:3].lower() == "pls":
+                self.remember_command(message)
             return
         if "You gave" not in message.content:
             return
@@ -561,6 +805,8 @@ class DankLogs(commands.Cog):
         if await self.config.channel(message.channel).ignored():
             return
         last_message = await self.get_last_message(message)
+        if not last_message:
+            return
         filtered_content = (
             message.content.strip()
             .lstrip(f"<@{last_message.author.id}>")
@@ -589,27 +835,29 @@ class DankLogs(commands.Cog):
         if not shared_user:
             return
 
-        shared_user_data = await self.config.member(shared_user).all()
-        user_data = await self.config.member(last_message.author).all()
+        guild_id = message.guild.id
+        author = last_message.author
+        counters = self.counters
 
         if last_message.content.lower().startswith(
             "pls share"
         ) or last_message.content.lower().startswith("pls give"):
-            if str(shared_user.id) not in user_data["sharedusers"]:
-                user_data["sharedusers"][str(shared_user.id)] = 0
-
-            user_data["sharedusers"][str(shared_user.id)] += 1
-            user_data["shared"] += amount
-            shared_user_data["received"] += amount
-            formatted_now = datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S")
-            user_data["logs"].append(
-                f"At {formatted_now}, {self.comma_format(amount)} was shared to {shared_user} (ID of {shared_user.id})"
+            counters.add_to(guild_id, author.id, "sharedusers", str(shared_user.id), 1)
+            counters.add(guild_id, author.id, "shared", amount)
+            counters.add(guild_id, shared_user.id, "received", amount)
+            now = time.time()
+            counters.record(
+                Transaction(
+                    guild_id, author.id, "shared", shared_user.id, amount, None, message.channel.id, now
+                )
             )
-            shared_user_data["logs"].append(
-                f"At {formatted_now}, {self.comma_format(amount)} was received from {last_message.author} (ID of {last_message.author.id})"
+            counters.record(
+                Transaction(
+                    guild_id, shared_user.id, "received", author.id, amount, None, message.channel.id, now
+                )
             )
-            await self.config.member(shared_user).set(shared_user_data)
-            await self.config.member(last_message.author).set(user_data)
+            counters.event()
+            self.share_leaderboards.add(guild_id, author.id, amount)
 
             channel = await self.config.guild(message.guild).channel()
             channel = self.bot.get_channel(channel)
@@ -622,31 +870,28 @@ class DankLogs(commands.Cog):
             await channel.send(embed=e)
 
         else:
-            if str(shared_user.id) not in user_data["giftedusers"]:
-                user_data["giftedusers"][str(shared_user.id)] = 0
-
-            user_data["giftedusers"][str(shared_user.id)] += 1
             item = match.group("item")
-            if item not in user_data["gifted"]:
-                user_data["gifted"][item] = 0
-            user_data["gifted"][item] += amount
-
-            if item not in shared_user_data["receiveditems"]:
-                shared_user_data["receiveditems"][item] = 0
-            shared_user_data["receiveditems"][item] += amount
-
-            formatted_now = datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S")
-            shared_user_data["logs"].append(
-                f"On {formatted_now}, {last_message.author} gave {self.comma_format(amount)} {item}"
+            counters.add_to(guild_id, author.id, "giftedusers", str(shared_user.id), 1)
+            counters.add_to(guild_id, author.id, "gifted", item, amount)
+            counters.add_to(guild_id, shared_user.id, "receiveditems", item, amount)
+            self.update_item_values(guild_id, ItemValues.add, "gifted", author.id, item, amount)
+            self.update_item_values(guild_id, ItemValues.add, "received", shared_user.id, item, amount)
+
+            now = time.time()
+            counters.record(
+                Transaction(
+                    guild_id, author.id, "gifted", shared_user.id, amount, item, message.channel.id, now
+                )
             )
-            user_data["logs"].append(
-                f"On {formatted_now}, {self.comma_format(amount)} {item} was sent to {shared_user}"
+            counters.record(
+                Transaction(
+                    guild_id, shared_user.id, "receiveditem", author.id, amount, item, message.channel.id, now
+                )
             )
+            counters.event()
 
             channel = await self.config.guild(message.guild).channel()
             channel = self.bot.get_channel(channel)
-            await self.config.member(shared_user).set(shared_user_data)
-            await self.config.member(last_message.author).set(user_data)
             if not channel:
                 return
             e = discord.Embed(
@@ -0,0 +1,104 @@
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from rapidfuzz import process
+
+# fuzzy matching only scores this many of the members sharing the most
+# trigrams with the name
+MAX_CANDIDATES = 256
+# trigrams shared by more than this share of the members (like " a") say
+# next to nothing about who is meant and are skipped when picking candidates
+COMMON_TRIGRAM = 0.002
+
+
+def trigrams(text: str) -> Set[str]:
+    text = f"  {text.lower()} "
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class NameIndex:
+    """Member names of one guild, indexed for resolving dank memer's name output
+
+    Lookups go exact name, stored name, decoded name and only then fuzzy, with
+    the fuzzy match run over the members sharing the most trigrams with the
+    decoded name instead of over the whole guild.
+    """
+
+    def __init__(self, normalize: Callable[[str], str]):
+        self.normalize = normalize
+        self.names: Dict[int, Tuple[str, str]] = {}
+        self.exact: Dict[str, Set[int]] = {}
+        self.decoded: Dict[str, Set[int]] = {}
+        self.stored: Dict[str, int] = {}
+        self.grams: Dict[str, Set[int]] = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, member_id: int, name: str) -> None:
+        if member_id in self.names:
+            if self.names[member_id][0] == name:
+                return
+            self.remove(member_id)
+        decoded = self.normalize(name)
+        self.names[member_id] = (name, decoded)
+        self.exact.setdefault(name, set()).add(member_id)
+        self.decoded.setdefault(decoded.lower(), set()).add(member_id)
+        for gram in trigrams(decoded):
+            self.grams.setdefault(gram, set()).add(member_id)
+
+    def remove(self, member_id: int) -> None:
+        names = self.names.pop(member_id, None)
+        if names is None:
+            return
+        name, decoded = names
+        self._discard(self.exact, name, member_id)
+        self._discard(self.decoded, decoded.lower(), member_id)
+        for gram in trigrams(decoded):
+            self._discard(self.grams, gram, member_id)
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[int]], key: str, member_id: int) -> None:
+        ids = index.get(key)
+        if ids is None:
+            return
+        ids.discard(member_id)
+        if not ids:
+            del index[key]
+
+    def store(self, name: str, member_id: int) -> None:
+        self.stored[name] = member_id
+
+    def candidates(self, decoded: str) -> List[int]:
+        limit = max(len(self.names) * COMMON_TRIGRAM, MAX_CANDIDATES)
+        postings = [self.grams[g] for g in trigrams(decoded) if g in self.grams]
+        rare = [ids for ids in postings if len(ids) <= limit]
+        counts = Counter()
+        for ids in rare or sorted(postings, key=len)[:1]:
+            counts.update(ids)
+        return [member_id for member_id, _ in counts.most_common(MAX_CANDIDATES)]
+
+    def resolve(self, name: str, score_cutoff: int = 75) -> Optional[int]:
+        """The id of the member ``name`` most likely is"""
+        ids = self.exact.get(name)
+        if ids:
+            return next(iter(ids))
+        member_id = self.stored.get(name)
+        if member_id in self.names:
+            return member_id
+
+        decoded = self.normalize(name)
+        ids = self.decoded.get(decoded.lower())
+        if ids:
+            return next(iter(ids))
+
+        match = process.extractOne(
+            name,
+            {m: self.names[m][1] for m in self.candidates(decoded)},
+            score_cutoff=score_cutoff,
+        )
+        return match[2] if match else None
+
+    def bulk_add(self, members: Iterable[Tuple[int, str]]) -> None:
+        for member_id, name in members:
+            self.add(member_id, name)
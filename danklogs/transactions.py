@@ -0,0 +1,131 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple
+
+
+class Transaction(NamedTuple):
+    guild_id: int
+    member_id: int
+    kind: str  # shared, received, gifted, receiveditem or legacy
+    counterparty: Optional[int]
+    amount: int
+    item: Optional[str]
+    channel_id: Optional[int]
+    timestamp: float
+    note: Optional[str] = None
+
+
+class TransactionLog:
+    """Append-only store of every members shares and gifts, in SQLite
+
+    Rows are only ever inserted and pruned, each member keeps at most
+    ``max_per_member`` rows and nothing older than ``max_age`` seconds.
+    Reads page from the newest row through the (guild, member, timestamp)
+    index so viewing logs never loads a members whole history.
+    """
+
+    def __init__(self, path: Path, max_per_member: int = 1000, max_age: int = 365 * 86400):
+        self.max_per_member = max_per_member
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS transactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    guild_id INTEGER NOT NULL,
+                    member_id INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    counterparty INTEGER,
+                    amount INTEGER NOT NULL,
+                    item TEXT,
+                    channel_id INTEGER,
+                    timestamp REAL NOT NULL,
+                    note TEXT
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS member_index ON transactions (guild_id, member_id, timestamp)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS timestamp_index ON transactions (timestamp)"
+            )
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _append(self, records: List[Transaction]) -> None:
+        members: Set[Tuple[int, int]] = {(r.guild_id, r.member_id) for r in records}
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO transactions (guild_id, member_id, kind, counterparty, amount, item,"
+                " channel_id, timestamp, note) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                records,
+            )
+            for guild_id, member_id in members:
+                self._db.execute(
+                    "DELETE FROM transactions WHERE id IN ("
+                    "SELECT id FROM transactions WHERE guild_id = ? AND member_id = ?"
+                    " ORDER BY timestamp DESC, id DESC LIMIT -1 OFFSET ?)",
+                    (guild_id, member_id, self.max_per_member),
+                )
+            self._db.execute(
+                "DELETE FROM transactions WHERE timestamp < ?",
+                (time.time() - self.max_age,),
+            )
+
+    async def append(self, records: Iterable[Transaction]) -> None:
+        records = list(records)
+        if records:
+            await self._run(self._append, records)
+
+    def _fetch(self, guild_id, member_id, limit, offset, since, until) -> List[Transaction]:
+        query = (
+            "SELECT guild_id, member_id, kind, counterparty, amount, item, channel_id,"
+            " timestamp, note FROM transactions WHERE guild_id = ? AND member_id = ?"
+        )
+        args = [guild_id, member_id]
+        if since is not None:
+            query += " AND timestamp >= ?"
+            args.append(since)
+        if until is not None:
+            query += " AND timestamp <= ?"
+            args.append(until)
+        query += " ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?"
+        args += [limit, offset]
+        with self._lock:
+            return [Transaction(*row) for row in self._db.execute(query, args)]
+
+    async def fetch(
+        self,
+        guild_id: int,
+        member_id: int,
+        limit: int = 10,
+        offset: int = 0,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> List[Transaction]:
+        """A members transactions, newest first"""
+        return await self._run(self._fetch, guild_id, member_id, limit, offset, since, until)
+
+    def _count(self, guild_id, member_id, since) -> int:
+        query = "SELECT COUNT(*) FROM transactions WHERE guild_id = ? AND member_id = ?"
+        args = [guild_id, member_id]
+        if since is not None:
+            query += " AND timestamp >= ?"
+            args.append(since)
+        with self._lock:
+            return self._db.execute(query, args).fetchone()[0]
+
+    async def count(self, guild_id: int, member_id: int, since: Optional[float] = None) -> int:
+        return await self._run(self._count, guild_id, member_id, since)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,62 @@
+from collections import Counter
+from typing import Dict
+
+from .leaderboard import Leaderboard
+
+KINDS = ("gifted", "received")
+
+
+class ItemValues:
+    """What the items each member of a guild gifted and received are worth
+
+    Item counts are kept per item (a column of {member: count}) next to each
+    members running totals, so a price change only goes over the members that
+    have that item instead of revaluing everyone's whole inventory.
+    """
+
+    def __init__(
+        self,
+        prices: Dict[str, int],
+        gifted: Dict[int, Dict[str, int]],
+        received: Dict[int, Dict[str, int]],
+    ):
+        self.prices = dict(prices)
+        self.columns: Dict[str, Dict[str, Dict[int, int]]] = {kind: {} for kind in KINDS}
+        self.totals: Dict[str, Counter] = {kind: Counter() for kind in KINDS}
+        for kind, items in (("gifted", gifted), ("received", received)):
+            for member_id, counts in items.items():
+                for item, amount in counts.items():
+                    self._add(kind, member_id, item, amount)
+        self.gifted_board = Leaderboard(self.totals["gifted"])
+
+    def _add(self, kind: str, member_id: int, item: str, amount: int) -> None:
+        column = self.columns[kind].setdefault(item, {})
+        column[member_id] = column.get(member_id, 0) + amount
+        self.totals[kind][member_id] += amount * self.prices.get(item, 0)
+
+    def add(self, kind: str, member_id: int, item: str, amount: int) -> None:
+        self._add(kind, member_id, item, amount)
+        if kind == "gifted":
+            self.gifted_board.update(member_id, self.totals[kind][member_id])
+
+    def set_price(self, item: str, price: int) -> int:
+        """Revalue everyone holding ``item``, returns how many totals changed"""
+        change = price - self.prices.get(item, 0)
+        self.prices[item] = price
+        if not change:
+            return 0
+        changed = 0
+        for kind in KINDS:
+            totals = self.totals[kind]
+            for member_id, amount in self.columns[kind].get(item, {}).items():
+                totals[member_id] += amount * change
+                if kind == "gifted":
+                    self.gifted_board.update(member_id, totals[member_id])
+                changed += 1
+        return changed
+
+    def has(self, kind: str, member_id: int) -> bool:
+        return member_id in self.totals[kind]
+
+    def total(self, kind: str, member_id: int) -> int:
+        return self.totals[kind].get(member_id, 0)
@@ -1,5 +1,7 @@
 from .giveaway import Giveaways
 
 
-def setup(bot):
-    bot.add_cog(Giveaways(bot))
+async def setup(bot):
+    cog = Giveaways(bot)
+    await cog.migrate_giveaways()
+    bot.add_cog(cog)
@@ -1,78 +1,157 @@
-from mee6_py_api import API
-from aiohttp import ClientSession
+from aiohttp import ClientError, ClientSession
 from bs4 import BeautifulSoup
-import re
+from collections import OrderedDict
+from typing import Dict, Tuple
+import asyncio
 import discord
+import time
 
 
 class mee6_api:
-    def __init__(self):
-        self.api_guild_cache = {}
+    """Client for the MEE6 leaderboard
 
-    async def get_user_rank(self, guild: str, user: str):
-        if guild not in self.api_guild_cache:
-            self.api_guild_cache[guild] = API(int(guild))
+    Instead of asking MEE6 for every user, the whole leaderboard of a guild is
+    paged through once and kept as user id -> level for ``ttl`` seconds.
+    Only the ``max_guilds`` most recently used guilds are kept in memory.
+    """
 
-        api = self.api_guild_cache[guild]
+    def __init__(
+        self,
+        ttl: int = 600,
+        max_guilds: int = 50,
+        page_size: int = 1000,
+        max_retries: int = 5,
+        base_url: str = "https://mee6.xyz/api/plugins/levels/leaderboard",
+    ):
+        self.session = ClientSession()
+        self.ttl = ttl
+        self.max_guilds = max_guilds
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.base_url = base_url
+        self._snapshots: "OrderedDict[int, Tuple[float, Dict[int, int]]]" = OrderedDict()
+        self._pending: Dict[int, asyncio.Future] = {}
+
+    async def _get_page(self, guild: int, page: int) -> dict:
+        url = f"{self.base_url}/{guild}"
+        params = {"page": page, "limit": self.page_size}
+        delay = 1.0
+        for _ in range(self.max_retries):
+            async with self.session.get(url, params=params) as response:
+                if response.status != 429:
+                    response.raise_for_status()
+                    return await response.json()
+                try:
+                    retry_after = float(response.headers.get("Retry-After", delay))
+                except ValueError:
+                    retry_after = delay
+            await asyncio.sleep(max(retry_after, delay))
+            delay *= 2
+        raise ClientError(f"Still ratelimited by MEE6 after {self.max_retries} tries")
+
+    async def _fetch_snapshot(self, guild: int) -> Dict[int, int]:
+        levels = {}
+        page = 0
+        try:
+            while True:
+                data = await self._get_page(guild, page)
+                players = data.get("players", [])
+                for player in players:
+                    levels[int(player["id"])] = player.get("level", 0)
+                if len(players) < self.page_size:
+                    break
+                page += 1
+        except ClientError:
+            if guild in self._snapshots:
+                return self._snapshots[guild][1]
+            raise
+
+        self._snapshots[guild] = (time.monotonic(), levels)
+        self._snapshots.move_to_end(guild)
+        while len(self._snapshots) > self.max_guilds:
+            self._snapshots.popitem(last=False)
+        return levels
 
-        return await api.levels.get_user_level(int(user))
+    async def get_snapshot(self, guild: int) -> Dict[int, int]:
+        cached = self._snapshots.get(guild)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            self._snapshots.move_to_end(guild)
+            return cached[1]
+
+        pending = self._pending.get(guild)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fetch_snapshot(guild))
+            self._pending[guild] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(guild, None))
+        return await asyncio.shield(pending)
+
+    async def get_user_rank(self, guild: int, user: int) -> int:
+        levels = await self.get_snapshot(int(guild))
+        return levels.get(int(user), 0)
 
 
 class Amari:
-    def __init__(self):
-        self.session = ClientSession()
+    """Client for lb.amaribot.com
 
-    async def get_amari_rank(self, guild: int, user: discord.User):
-        gid = guild
-        username = user.name
-        url = f"https://lb.amaribot.com/weekly.php?gID={gid}"
+    The leaderboard page for a guild is downloaded and parsed at most once
+    every ``ttl`` seconds, callers for a guild that is already being fetched
+    wait on that same request.
+    """
 
-        async with self.session.request("GET", url) as response:
-            text = await response.text()
+    def __init__(self, ttl: int = 300, base_url: str = "https://lb.amaribot.com"):
+        self.session = ClientSession()
+        self.ttl = ttl
+        self.base_url = base_url
+        self._leaderboards: Dict[int, Tuple[float, Dict[str, Tuple[int, int]]]] = {}
+        self._pending: Dict[int, asyncio.Future] = {}
+
+    @staticmethod
+    def parse_leaderboard(text: str) -> Dict[str, Tuple[int, int]]:
+        """Parse the leaderboard page into username -> (level, weekly exp)"""
         obj = BeautifulSoup(text, "html.parser")
         rank_list = obj.body.main.findAll("div")[2].div.find("table").findAll("tr")
-        tag = None
+        leaderboard = {}
         for tag in rank_list:
-            if username in str(tag):
-                break
-        check = re.compile(
-                r"<tr><td>(\d+)<\/td><td>({})<\/td><td>(\d+)<\/td><td>(\d+)<\/td><\/tr>".format(
-                    re.escape(username)
-                )
-            )
-        
-        if not tag:
-            return None
-        match = re.match(check, str(tag))
+            cells = tag.findAll("td")
+            if len(cells) != 4:
+                continue
+            try:
+                weekly = int(cells[2].text)
+                level = int(cells[3].text)
+            except ValueError:
+                continue
+            leaderboard.setdefault(cells[1].text, (level, weekly))
+        return leaderboard
 
+    async def _fetch_leaderboard(self, guild: int) -> Dict[str, Tuple[int, int]]:
+        url = f"{self.base_url}/weekly.php?gID={guild}"
         try:
-            return int(match.group(4))
-        except (TypeError, AttributeError):
-            return 0
+            async with self.session.request("GET", url) as response:
+                text = await response.text()
+            leaderboard = self.parse_leaderboard(text)
+        except (ClientError, AttributeError, IndexError):
+            if guild in self._leaderboards:
+                return self._leaderboards[guild][1]
+            raise
+        self._leaderboards[guild] = (time.monotonic(), leaderboard)
+        return leaderboard
 
-    async def get_weekly_rank(self, guild: int, user: discord.User):
-        gid = guild
-        username = user.name
-        url = f"https://lb.amaribot.com/weekly.php?gID={gid}"
+    async def get_leaderboard(self, guild: int) -> Dict[str, Tuple[int, int]]:
+        cached = self._leaderboards.get(guild)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
 
-        async with self.session.request("GET", url) as response:
-            text = await response.text()
-        obj = BeautifulSoup(text, "html.parser")
-        rank_list = obj.body.main.findAll("div")[2].div.find("table").findAll("tr")
-        tag = None
-        for tag in rank_list:
-            if username in str(tag):
-                break
-        check = re.compile(
-                r"<tr><td>(\d+)<\/td><td>({})<\/td><td>(\d+)<\/td><td>(\d+)<\/td><\/tr>".format(
-                    re.escape(username)
-                )
-            )
-        if not tag:
-            return
-        match = re.match(check, str(tag))
+        pending = self._pending.get(guild)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fetch_leaderboard(guild))
+            self._pending[guild] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(guild, None))
+        return await asyncio.shield(pending)
 
-        try:
-            return int(match.group(3))
-        except (TypeError, AttributeError):
-            return 0
+    async def get_amari_rank(self, guild: int, user: discord.User):
+        leaderboard = await self.get_leaderboard(guild)
+        return leaderboard.get(user.name, (0, 0))[0]
+
+    async def get_weekly_rank(self, guild: int, user: discord.User):
+        leaderboard = await self.get_leaderboard(guild)
+        return leaderboard.get(user.name, (0, 0))[1]
@@ -0,0 +1,112 @@
+import asyncio
+import discord
+import logging
+
+from collections import Counter
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+log = logging.getLogger("red.andycogs.giveaways")
+
+
+class DMJob:
+    """One embed sent to a group of users, with what happened to each DM"""
+
+    __slots__ = ("embed", "remaining", "counts", "on_done")
+
+    def __init__(
+        self,
+        embed: discord.Embed,
+        remaining: int,
+        on_done: Optional[Callable[[Counter], Awaitable[None]]],
+    ):
+        self.embed = embed
+        self.remaining = remaining
+        self.counts = Counter(delivered=0, forbidden=0, failed=0)
+        self.on_done = on_done
+
+
+class DMDispatcher:
+    """Sends giveaway DMs in the background
+
+    Every recipient of a job gets the same embed, so it is only built once.
+    ``concurrency`` workers send from one queue, discord.py already waits out
+    429s so only 5xx errors are retried here, with backoff. ``on_done`` gets
+    the delivered/forbidden/failed counts of a job once all of its DMs are
+    through.
+    """
+
+    def __init__(self, concurrency: int = 5, retries: int = 3):
+        self.concurrency = concurrency
+        self.retries = retries
+        self._queue: "asyncio.Queue" = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self.stats = Counter(delivered=0, forbidden=0, failed=0, retried=0)
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def submit(
+        self,
+        recipients: Iterable[discord.abc.Messageable],
+        embed: discord.Embed,
+        on_done: Optional[Callable[[Counter], Awaitable[None]]] = None,
+    ) -> None:
+        recipients = list(recipients)
+        job = DMJob(embed, len(recipients), on_done)
+        if not recipients:
+            if on_done:
+                asyncio.create_task(self._finish(job))
+            return
+
+        for recipient in recipients:
+            self._queue.put_nowait((job, recipient))
+        # replace any worker that died instead of leaving the queue short
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.concurrency:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def _worker(self) -> None:
+        while True:
+            job, recipient = await self._queue.get()
+            try:
+                result = await self._send(recipient, job.embed)
+                job.counts[result] += 1
+                self.stats[result] += 1
+                job.remaining -= 1
+                if job.remaining == 0 and job.on_done:
+                    await self._finish(job)
+            finally:
+                self._queue.task_done()
+
+    async def _send(self, recipient: discord.abc.Messageable, embed: discord.Embed) -> str:
+        for attempt in range(self.retries + 1):
+            try:
+                await recipient.send(embed=embed)
+                return "delivered"
+            except discord.Forbidden:
+                return "forbidden"
+            except discord.HTTPException as e:
+                if e.status < 500 or attempt == self.retries:
+                    log.warning("Couldn't DM %s: %s", getattr(recipient, "id", None), e)
+                    return "failed"
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # anything else, like a dropped connection or a timeout
+                log.exception("Couldn't DM %s", getattr(recipient, "id", None))
+                return "failed"
+            self.stats["retried"] += 1
+            await asyncio.sleep(2 ** attempt)
+
+    async def _finish(self, job: DMJob) -> None:
+        try:
+            await job.on_done(job.counts)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Error while reporting giveaway DMs")
+
+    def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        self._workers.clear()
@@ -25,22 +25,41 @@ SOFTWARE.
 import asyncio
 import argparse
 import discord
+import logging
+import time
 
+from collections import Counter
+from copy import deepcopy
 from datetime import datetime
-from mee6_py_api import API
 from redbot.core import commands, Config
 from redbot.core.bot import Red
 from typing import Optional, Union
-from random import choice, randint
 from .converters import FuzzyRole, IntOrLink, TimeConverter
 from redbot.core.commands import BadArgument
 from redbot.core.utils.chat_formatting import pagify, humanize_list
-from redbot.core.utils.menus import DEFAULT_CONTROLS, menu
+from redbot.core.utils.menus import DEFAULT_CONTROLS, menu, next_page, prev_page
 from .api import mee6_api, Amari
+from .dms import DMDispatcher
+from .invites import InviteCache
+from .leaderboard import LeaderboardIndex
+from .sampling import WeightedReservoir
+from .ratelimit import EditQueue
+from .requirements import EligibilityCache, REQUIREMENT_MESSAGES, RequirementChain
+from .scheduler import GiveawayScheduler, END
 
 mee6_api = mee6_api()
 amari_api = Amari()
 
+log = logging.getLogger("red.andycogs.giveaways")
+
+REACTION_PAGE_SIZE = 100
+# giveaways restored per warm-up batch, each batch gets its first refresh a
+# second after the one before so a restart doesn't edit everything at once
+WARMUP_BATCH_SIZE = 50
+LIST_PAGE_SIZE = 8
+# donator role syncs change this many members, then wait a second
+ROLE_SYNC_BATCH_SIZE = 5
+
 
 class NoExitParser(argparse.ArgumentParser):
     def error(self, message):
@@ -87,7 +106,8 @@ class Giveaways(commands.Cog):
             "blacklist": [],
             "delete": False,
             "default_req": None,
-            "giveaways": {},
+            "giveaways": {},  # legacy, moved to the giveaway custom group
+            "active": [],
             "dmwin": False,
             "dmhost": False,
             "startHeader": "**{giveawayEmoji}   GIVEAWAY   {giveawayEmoji}**",
@@ -106,19 +126,157 @@ class Giveaways(commands.Cog):
             "notes": [],
         }
 
-        default_global = {"secretblacklist": []}
+        default_global = {
+            "secretblacklist": [],
+            "schema_version": 0,
+            "eligibility_concurrency": 10,
+        }
+
+        default_giveaway = {
+            "host": None,
+            "Ongoing": False,
+            "requirements": {},
+            "winners": 1,
+            "title": "Giveaway!",
+            "endtime": 0,
+            "channel": None,
+            "donor": None,
+        }
 
         default_role = {
             "multiplier": 0,
         }
 
+        self.default_settings = {
+            k: v
+            for k, v in default_guild.items()
+            if k not in ("giveaways", "active")
+        }
+        self.settings_cache = {}
+        self.role_sets = {}
+        self.requirement_chains = {}
+        self.rejection_stats = Counter()
+        self.eligibility_cache = EligibilityCache()
+        self.secretblacklist_cache = None
+        self.settings_cache_stats = {"hits": 0, "misses": 0}
+
+        self.migration_lock = asyncio.Lock()
+        self.multiplier_lock = asyncio.Lock()
+        self.multiplier_cache = {}
         self.message_cache = {}
         self.giveaway_cache = {}
+        self.active_giveaways = {}
+        # int message ids of active giveaways, the reaction listeners check this
+        # before anything else since nearly every reaction isn't on a giveaway
+        self.active_ids = set()
+        # guild id -> {message id: info} of its active giveaways, for g list
+        self.guild_active = {}
+        self.active_guild_ids = {}
+        self.rendered = {}
+        self.entrants = {}
+        self.synced = set()
+        # message ids of giveaways whose end is running right now
+        self.ending = set()
+        self.reacted = {}
+        self.warmup = {
+            "state": "waiting",
+            "guilds": 0,
+            "channels": 0,
+            "giveaways": 0,
+            "restored": 0,
+            "skipped": 0,
+            "started": None,
+            "duration": None,
+        }
+        self.edit_queue = EditQueue(on_not_found=self.edit_not_found)
+        self.dm_dispatcher = DMDispatcher()
+        self.invite_cache = InviteCache(self.create_invite, self.validate_invite)
+        self.donation_leaderboards = LeaderboardIndex(self.load_donations)
+        self.role_sync_tasks = {}
+        self.scheduler = GiveawayScheduler(
+            self.refresh_giveaway, self.end_scheduled_giveaway
+        )
 
         self.config.register_guild(**default_guild)
         self.config.register_member(**default_member)
         self.config.register_global(**default_global)
         self.config.register_role(**default_role)
+        self.config.init_custom("giveaway", 2)
+        self.config.register_custom("giveaway", **default_giveaway)
+        self.config.init_custom("entrants", 2)
+        self.config.register_custom("entrants", users=[])
+
+    # -------------------------------------Storage---------------------------------
+    async def migrate_giveaways(self) -> None:
+        """Move giveaways out of the guild blob into one record per giveaway"""
+        async with self.migration_lock:
+            if await self.config.schema_version() >= 1:
+                return
+
+            for guild_id, data in (await self.config.all_guilds()).items():
+                giveaways = data.get("giveaways")
+                if not giveaways:
+                    continue
+                await self.config.custom("giveaway", str(guild_id)).set(giveaways)
+                await self.config.guild_from_id(int(guild_id)).active.set(
+                    [m for m, info in giveaways.items() if info["Ongoing"]]
+                )
+                await self.config.guild_from_id(int(guild_id)).giveaways.clear()
+
+            await self.config.schema_version.set(1)
+
+    async def get_giveaway(self, guild_id: int, messageid) -> Optional[dict]:
+        return await self.config.custom("giveaway", str(guild_id)).get_raw(
+            str(messageid), default=None
+        )
+
+    async def get_all_giveaways(self, guild_id: int) -> dict:
+        """Every stored giveaway for a guild, including ended ones. This can be big"""
+        return await self.config.custom("giveaway", str(guild_id)).all()
+
+    async def get_active_giveaways(self, guild_id: int) -> dict:
+        active = await self.config.guild_from_id(guild_id).active()
+        group = self.config.custom("giveaway", str(guild_id))
+        giveaways = {}
+        for messageid in active:
+            info = await group.get_raw(messageid, default=None)
+            if info:
+                giveaways[messageid] = info
+        return giveaways
+
+    async def save_giveaway(self, guild_id: int, messageid, info: dict) -> None:
+        await self.config.custom("giveaway", str(guild_id), str(messageid)).set(info)
+        if info["Ongoing"]:
+            async with self.config.guild_from_id(guild_id).active() as active:
+                if str(messageid) not in active:
+                    active.append(str(messageid))
+
+    async def mark_ended(self, guild_id: int, messageid) -> None:
+        await self.config.custom(
+            "giveaway", str(guild_id), str(messageid)
+        ).Ongoing.set(False)
+        await self.remove_active(guild_id, messageid)
+
+    async def delete_giveaway(self, guild_id: int, messageid) -> None:
+        await self.config.custom("giveaway", str(guild_id), str(messageid)).clear()
+        await self.config.custom("entrants", str(guild_id), str(messageid)).clear()
+        await self.remove_active(guild_id, messageid)
+
+    async def get_entrants(self, guild_id: int, messageid) -> Optional[set]:
+        entrants = await self.config.custom("entrants", str(guild_id)).get_raw(
+            str(messageid), "users", default=None
+        )
+        return set(entrants) if entrants is not None else None
+
+    async def save_entrants(self, guild_id: int, messageid, entrants: set) -> None:
+        await self.config.custom("entrants", str(guild_id), str(messageid)).users.set(
+            sorted(entrants)
+        )
+
+    async def remove_active(self, guild_id: int, messageid) -> None:
+        async with self.config.guild_from_id(guild_id).active() as active:
+            if str(messageid) in active:
+                active.remove(str(messageid))
 
     # -------------------------------------Functions---------------------------------
     async def count_invites(self, member: discord.Member):
@@ -128,9 +286,54 @@ class Giveaways(commands.Cog):
         invites = await cog.config.member(member).invites()
         return invites
 
+    async def get_guild_settings(self, guild: discord.Guild) -> dict:
+        """Get the guilds settings without the giveaways. Don't mutate what this returns"""
+        settings = self.settings_cache.get(guild.id)
+        if settings is not None:
+            self.settings_cache_stats["hits"] += 1
+            return settings
+
+        self.settings_cache_stats["misses"] += 1
+        group = self.config.guild(guild)
+        settings = {}
+        for key in self.default_settings:
+            settings[key] = await group.get_attr(key)()
+        self.settings_cache[guild.id] = settings
+        return settings
+
+    async def set_setting(self, guild: discord.Guild, key: str, value) -> None:
+        await self.config.guild(guild).get_attr(key).set(value)
+        self.role_sets.pop(guild.id, None)
+        self.eligibility_cache.invalidate_guild(guild.id)
+        if guild.id in self.settings_cache:
+            self.settings_cache[guild.id][key] = value
+
+    async def clear_setting(self, guild: discord.Guild, key: str) -> None:
+        await self.config.guild(guild).get_attr(key).clear()
+        self.role_sets.pop(guild.id, None)
+        self.eligibility_cache.invalidate_guild(guild.id)
+        if guild.id in self.settings_cache:
+            self.settings_cache[guild.id][key] = deepcopy(self.default_settings[key])
+
+    async def get_secretblacklist(self) -> set:
+        if self.secretblacklist_cache is None:
+            self.settings_cache_stats["misses"] += 1
+            self.secretblacklist_cache = set(await self.config.secretblacklist())
+        else:
+            self.settings_cache_stats["hits"] += 1
+        return self.secretblacklist_cache
+
     def comma_format(self, number: int):
         return "{:,}".format(number)
 
+    def bucket_time(self, seconds: int) -> int:
+        """Round the time left down so the embed only changes when what it shows changes"""
+        if seconds >= 86_400:
+            return seconds - seconds % 3_600
+        elif seconds >= 120:
+            return seconds - seconds % 60
+        return seconds
+
     def display_time(self, seconds: int) -> str:
         message = ""
 
@@ -154,113 +357,256 @@ class Giveaways(commands.Cog):
 
     async def giveaway_loop(self):
         await self.bot.wait_until_ready()
-        self.tasks = []
-
-        for guild, data in (await self.config.all_guilds()).items():
-            for messageid, info in data["giveaways"].items():
-                if info["Ongoing"]:
-                    self.tasks.append(
-                        asyncio.create_task(self.start_giveaway(int(messageid), info))
-                    )
-
-    async def can_join(self, user: discord.Member, info):
+        await self.migrate_giveaways()
         try:
-            data = await self.config.guild(user.guild).all()
-        except AttributeError:
-            return False
-        secretblacklist = await self.config.secretblacklist()
-        if user.id in secretblacklist:
-            return False
-        if len(data["bypassrole"]) == 0:
-            pass
-        else:
-            for r in data["bypassrole"]:
-                if r in [r.id for r in user.roles]:
-                    return True
+            await self.warm_up()
+        except Exception:
+            log.exception("Error while restoring active giveaways")
+            self.warmup["state"] = "failed"
+        await self.scheduler.run()
+
+    async def warm_up(self):
+        """Restore every active giveaway after a restart
+
+        Guild settings are read in one go, then only the giveaways in each guild's
+        active index, so ended ones are never loaded. They are grouped by channel
+        and their message handles restored from the message cache or as partial
+        messages, so nothing is fetched here. Their first refreshes, and the ends
+        of the ones that ran out while the bot was down, are spread out per batch
+        instead of all being due at once.
+        """
+        status = self.warmup
+        status["state"] = "running"
+        status["started"] = time.monotonic()
 
-        requirements = info["requirements"]
-        if len(data["blacklist"]) == 0:
-            pass
-        else:
-            for r in data["blacklist"]:
-                if r in [r.id for r in user.roles]:
-                    r = user.guild.get_role(int(r))
-                    if not r:
-                        continue
-                    return (
-                        False,
-                        f"You have the {r.name} role which has prevented you from entering [JUMP_URL_HERE] giveaway",
-                    )
-        if not requirements["roles"]:
-            pass
-        else:
-            for r in requirements["roles"]:
-                if r in [role.id for role in user.roles]:
+        all_guilds = await self.config.all_guilds()
+
+        by_channel = {}
+        for guild_id, data in all_guilds.items():
+            if not data["active"]:
+                continue
+            status["guilds"] += 1
+            self.settings_cache.setdefault(
+                int(guild_id), {key: data[key] for key in self.default_settings}
+            )
+            giveaways = await self.get_active_giveaways(int(guild_id))
+            for messageid, info in giveaways.items():
+                if not info.get("Ongoing"):
                     continue
-                r = user.guild.get_role(int(r))
-                if not r:
+                by_channel.setdefault(info["channel"], []).append((messageid, info))
+                status["giveaways"] += 1
+        status["channels"] = len(by_channel)
+
+        now = datetime.utcnow().timestamp()
+        for channel_id, giveaways in by_channel.items():
+            channel = self.bot.get_channel(channel_id)
+            for messageid, info in giveaways:
+                if not channel:
+                    status["skipped"] += 1
                     continue
-                return (
-                    False,
-                    f"You do not have the `{r.name}` role which is required for [JUMP_URL_HERE] giveaway",
+                message = self.bot._connection._get_message(int(messageid))
+                self.message_cache[messageid] = message or channel.get_partial_message(
+                    int(messageid)
                 )
+                self.start_giveaway(
+                    channel.guild.id,
+                    int(messageid),
+                    info,
+                    now + status["restored"] // WARMUP_BATCH_SIZE,
+                )
+                status["restored"] += 1
+                if status["restored"] % WARMUP_BATCH_SIZE == 0:
+                    await asyncio.sleep(0)
+
+        status["duration"] = time.monotonic() - status["started"]
+        status["state"] = "done"
+        log.info(
+            "Restored %s giveaways in %s channels in %.2fs",
+            status["restored"],
+            status["channels"],
+            status["duration"],
+        )
 
-        if requirements["mee6"]:
-            user_level = await mee6_api.get_user_rank(user.guild.id, user.id)
+    def compile_requirements(self, requirements: dict) -> RequirementChain:
+        key = RequirementChain.key_for(requirements)
+        chain = self.requirement_chains.get(key)
+        if chain is None:
+            if len(self.requirement_chains) >= 1024:
+                self.requirement_chains.clear()
+            chain = self.requirement_chains[key] = RequirementChain(requirements)
+        return chain
+
+    def get_role_sets(self, guild: discord.Guild, settings: dict) -> tuple:
+        """The bypass and blacklisted role ids of a guild as frozensets"""
+        role_sets = self.role_sets.get(guild.id)
+        if role_sets is None:
+            role_sets = self.role_sets[guild.id] = (
+                frozenset(settings["bypassrole"]),
+                frozenset(settings["blacklist"]),
+            )
+        return role_sets
 
-            if user_level < requirements["mee6"]:
-                return (
-                    False,
-                    f"You need {requirements['mee6'] - user_level} more MEE6 levels to enter [JUMP_URL_HERE] giveaway",
-                )
+    async def requirement_value(self, name: str, user: discord.Member):
+        """What a member has for a requirement, or None if it can't be checked"""
+        if name == "joindays":
+            return (datetime.utcnow() - user.joined_at).days
+        elif name == "shared":
+            cog = self.bot.get_cog("DankLogs")
+            if not cog or cog.__author__ != "Andy":
+                return None
+            if hasattr(cog, "get_shared"):
+                # counts the shares still waiting to be written to its config
+                return await cog.get_shared(user)
+            return await cog.config.member(user).shared()
+        elif name == "invites":
+            return await self.count_invites(user)
+        elif name == "mee6":
+            return await mee6_api.get_user_rank(user.guild.id, user.id)
+        elif name == "amari":
+            return await amari_api.get_amari_rank(user.guild.id, user)
+        elif name == "weeklyamari":
+            return await amari_api.get_weekly_rank(user.guild.id, user)
 
-        if requirements["amari"]:
-            user_level = await amari_api.get_amari_rank(user.guild.id, user)
-            if user_level < requirements["amari"]:
-                return (
-                    False,
-                    f"You need {requirements['amari'] - user_level} more Amari levels to enter [JUMP_URL_HERE] giveaway",
-                )
+    async def can_join(self, user: discord.Member, info):
+        guild = getattr(user, "guild", None)
+        if guild is None:
+            return False
+        chain = self.compile_requirements(info["requirements"])
+        verdict = self.eligibility_cache.get(guild.id, user.id, chain.key)
+        if verdict is None:
+            verdict = await self.check_requirements(user, chain)
+            # nothing tells us when someone joins the required server, so a
+            # failure there shouldn't stick around until the TTL runs out
+            if verdict is True or not chain.server:
+                self.eligibility_cache.set(guild.id, user.id, chain.key, verdict)
+        return verdict
+
+    async def check_requirements(self, user: discord.Member, chain: RequirementChain):
+        data = await self.get_guild_settings(user.guild)
+        if user.id in await self.get_secretblacklist():
+            return False
 
-        if requirements["weeklyamari"]:
-            user_level = await amari_api.get_weekly_rank(user.guild.id, user)
+        bypass, blacklist = self.get_role_sets(user.guild, data)
+        role_ids = {r.id for r in user.roles}
+        if not bypass.isdisjoint(role_ids):
+            return True
 
-            if user_level < requirements["weeklyamari"]:
-                return (
-                    False,
-                    f"You need {requirements['weeklyamari'] - user_level} more weekly amari points to enter [JUMP_URL_HERE] giveaway",
-                )
+        for r in blacklist & role_ids:
+            r = user.guild.get_role(r)
+            if not r:
+                continue
+            self.rejection_stats["blacklist"] += 1
+            return (
+                False,
+                f"You have the {r.name} role which has prevented you from entering [JUMP_URL_HERE] giveaway",
+            )
 
-        if requirements["joindays"]:
-            days = (datetime.utcnow() - user.joined_at).days
-            if days < requirements["joindays"]:
-                return (
-                    False,
-                    f"You need to be in the server for {requirements['joindays'] - days} more days to enter [JUMP_URL_HERE] giveaway",
-                )
-        if requirements["shared"]:
-            cog = self.bot.get_cog("DankLogs")
-            if not cog:
-                pass
-            elif cog.__author__ != "Andy":
-                pass
-            else:
-                shared = await cog.config.member(user).shared()
-                if shared < requirements["shared"]:
-                    return (
-                        False,
-                        f"You need to share {requirements['shared'] - shared} more coins in this server to join [JUMP_URL_HERE] giveaway",
-                    )
-        if requirements["invites"]:
-            invites = await self.count_invites(user)
-            if invites < requirements["invites"]:
+        for r in chain.roles - role_ids:
+            r = user.guild.get_role(r)
+            if not r:
+                continue
+            self.rejection_stats["roles"] += 1
+            return (
+                False,
+                f"You do not have the `{r.name}` role which is required for [JUMP_URL_HERE] giveaway",
+            )
+
+        if chain.server:
+            server = self.bot.get_guild(chain.server)
+            if server and server.get_member(user.id) is None:
+                self.rejection_stats["server"] += 1
+                invite = await self.invite_cache.get(server)
+                name = f"[{server.name}]({invite})" if invite else server.name
                 return (
                     False,
-                    f"You need to have {requirements['invites'] - invites} more invites to join [JUMP_URL_HERE] giveaway",
+                    f"You need to be in the **{name}** server to join [JUMP_URL_HERE] giveaway",
                 )
 
+        for name, amount in chain.thresholds:
+            value = await self.requirement_value(name, user)
+            if value is None or value >= amount:
+                continue
+            self.rejection_stats[name] += 1
+            return False, REQUIREMENT_MESSAGES[name].format(amount - value)
+
         return True
 
+    async def iter_reactors(self, reaction: Optional[discord.Reaction], record: set):
+        """Page through the reactors of a giveaway, adding their ids to ``record``"""
+        if reaction is None:
+            return
+        async for user in reaction.users(limit=None):
+            if not user.bot:
+                record.add(user.id)
+            yield user
+
+    async def iter_entrants(self, guild: discord.Guild, entrants: set):
+        for user_id in entrants:
+            member = guild.get_member(user_id)
+            if member:
+                yield member
+
+    async def draw_winners(self, users, info: dict, amount: int) -> list:
+        """Stream entrants through the eligibility checks and draw up to ``amount`` winner ids
+
+        ``users`` is an async iterator of entrants, they are filtered as they come
+        in and handed to a bounded queue that ``eligibility_concurrency`` workers
+        check from, so only about a page of members is held at once.
+        """
+        concurrency = await self.config.eligibility_concurrency()
+        secretblacklist = await self.get_secretblacklist()
+        reservoir = WeightedReservoir(amount)
+        queue = asyncio.Queue(maxsize=REACTION_PAGE_SIZE)
+        stats = {"fetch": 0.0, "sample": 0.0, "entrants": 0, "eligible": 0}
+        started = time.perf_counter()
+
+        async def produce():
+            seen = set()
+            async for user in users:
+                if user.bot or isinstance(user, discord.User):
+                    continue
+                if user.id in seen or user.id in secretblacklist:
+                    continue
+                seen.add(user.id)
+                await queue.put(user)
+            stats["fetch"] = time.perf_counter() - started
+            stats["entrants"] = len(seen)
+
+        async def consume():
+            while True:
+                member = await queue.get()
+                try:
+                    if await self.can_join(member, info) == True:
+                        multi = await self.calculate_multi(member)
+                        sample_start = time.perf_counter()
+                        reservoir.add(member.id, multi)
+                        stats["sample"] += time.perf_counter() - sample_start
+                        stats["eligible"] += 1
+                except Exception:
+                    log.exception("Couldn't check %s for a giveaway", member.id)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(consume()) for _ in range(concurrency)]
+        try:
+            await produce()
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+        log.debug(
+            "Drew winners for %s: %s entrants, %s eligible, entrants fetched in %.2fs, "
+            "checks done in %.2fs, %.4fs spent sampling",
+            info["title"],
+            stats["entrants"],
+            stats["eligible"],
+            stats["fetch"],
+            time.perf_counter() - started,
+            stats["sample"],
+        )
+        return reservoir.result()
+
     def get_color(self, timeleft: int):
         if timeleft <= 30:
             return discord.Color(value=0xff0000)
@@ -270,186 +616,257 @@ class Giveaways(commands.Cog):
             return discord.Color(value=0xffff00)
         return discord.Color.green()
 
-    async def calculate_multi(self, user: discord.Member):
-        total_multi = 1
-        for r in user.roles:
-            total_multi += await self.config.role(r).multiplier()
-
-        return total_multi
+    async def get_role_multipliers(self, guild: discord.Guild) -> dict:
+        """Role id -> multiplier for every role in the guild with a multiplier"""
+        multipliers = self.multiplier_cache.get(guild.id)
+        if multipliers is not None:
+            return multipliers
+        async with self.multiplier_lock:
+            if guild.id in self.multiplier_cache:
+                return self.multiplier_cache[guild.id]
+            all_roles = await self.config.all_roles()
+            multipliers = {}
+            for role in guild.roles:
+                data = all_roles.get(role.id)
+                if data and data["multiplier"]:
+                    multipliers[role.id] = data["multiplier"]
+            self.multiplier_cache[guild.id] = multipliers
+        return multipliers
 
-    async def create_invite(self, guild: discord.Guild):
+    async def calculate_multi(self, user: discord.Member):
+        multipliers = await self.get_role_multipliers(user.guild)
+        if not multipliers:
+            return 1
+        role_ids = multipliers.keys() & {r.id for r in user.roles}
+        return 1 + sum(multipliers[r] for r in role_ids)
+
+    async def create_invite(self, guild: discord.Guild) -> Optional[str]:
+        """Make an invite for a server requirement, use invite_cache.get instead of calling this"""
         for channel in guild.text_channels:
             if channel.permissions_for(guild.me).create_instant_invite:
-                invite = await channel.create_invite(
-                    reason="For a server join requirement", unique=False
-                )
-                if not invite:
+                try:
                     invite = await channel.create_invite(
-                        reason="For a server join requirement"
+                        reason="For a server join requirement", unique=False
                     )
+                    if not invite:
+                        invite = await channel.create_invite(
+                            reason="For a server join requirement"
+                        )
+                except discord.HTTPException:
+                    continue
                 return f"https://discord.gg/{invite.id}"
-        return "Couldn't make an invite"
+        return None
 
-    async def start_giveaway(self, messageid: int, info):
+    async def validate_invite(self, guild: discord.Guild, url: str) -> bool:
+        try:
+            invite = await self.bot.fetch_invite(url, with_counts=False)
+        except discord.NotFound:
+            return False
+        except discord.HTTPException:
+            return True  # can't tell right now, it gets checked again next time
+        return invite.guild is not None and invite.guild.id == guild.id
+
+    def start_giveaway(
+        self, guild_id: int, messageid: int, info, first_refresh: Optional[float] = None
+    ):
+        self.compile_requirements(info["requirements"])
+        self.giveaway_cache[str(messageid)] = True
+        self.entrants.setdefault(str(messageid), set())
+        self.active_giveaways[str(messageid)] = info
+        self.active_ids.add(int(messageid))
+        self.guild_active.setdefault(guild_id, {})[str(messageid)] = info
+        self.active_guild_ids[str(messageid)] = guild_id
+        self.scheduler.schedule(
+            str(messageid), first_refresh or datetime.utcnow().timestamp()
+        )
+        # scheduled up front so a failing refresh can't keep it from ending,
+        # overdue ones restored by warm_up end in the batch they were restored in
+        self.scheduler.schedule(
+            str(messageid), max(info["endtime"], first_refresh or 0), END
+        )
+
+    async def refresh_giveaway(self, messageid: str):
+        info = self.active_giveaways.get(messageid)
+        if not info or self.giveaway_cache.get(messageid, False) == False:
+            return
         channel = self.bot.get_channel(info["channel"])
-        self.bot._connection._get_message(int(messageid))
         if not channel:
             return
 
+        if info["endtime"] - datetime.utcnow().timestamp() <= 0:
+            return  # the end is already scheduled
+
         message = self.message_cache.get(
-            str(messageid), self.bot._connection._get_message(int(messageid))
+            messageid, self.bot._connection._get_message(int(messageid))
         )
 
         if not message:
             message = channel.get_partial_message(int(messageid))
 
-        self.message_cache[str(messageid)] = message
-        self.giveaway_cache[str(messageid)] = True
+        self.message_cache[messageid] = message
 
-        bypassrole = await self.config.guild(message.guild).bypassrole()
-        data = await self.config.guild(message.guild).all()
-        gaws = await self.config.guild(message.guild).giveaways()
+        data = await self.get_guild_settings(message.guild)
 
-        while True:
-            remaining = info["endtime"] - datetime.utcnow().timestamp()
-            if str(messageid) not in gaws:
-                return
-            elif self.giveaway_cache.get(str(messageid), False) == False:
-                return
+        remaining = datetime.fromtimestamp(info["endtime"]) - datetime.utcnow()
+        pretty_time = self.display_time(
+            self.bucket_time(round(remaining.total_seconds()))
+        )
 
-            elif remaining <= 0:
-                self.message_cache[str(messageid)] = await channel.fetch_message(
-                    messageid
-                )
-                self.giveaway_cache[str(messageid)] = False
-                self.tasks.append(
-                    asyncio.create_task(self.end_giveaway(int(messageid), info))
-                )
-                return
+        host = message.guild.get_member(info["host"])
 
-            remaining = datetime.fromtimestamp(info["endtime"]) - datetime.utcnow()
-            pretty_time = self.display_time(round(remaining.total_seconds()))
+        if not host:
+            host = "Host Not Found"
+        else:
+            host = host.mention
 
-            host = message.guild.get_member(info["host"])
+        color = self.get_color(remaining.total_seconds())
 
-            if not host:
-                host = "Host Not Found"
-            else:
-                host = host.mention
-
-            color = self.get_color(remaining.total_seconds())
+        e = discord.Embed(
+            title=info["title"],
+            description=data["description"].replace("{emoji}", data["emoji"]),
+            color=color,
+        )
+        e.description += f"\nTime Left: **{pretty_time}** \n"
+        e.description += f"Host: {host}"
 
-            e = discord.Embed(
-                title=info["title"],
-                description=data["description"].replace("{emoji}", data["emoji"]),
-                color=color,
+        if info["donor"]:
+            e.add_field(
+                name="Donor", value="<@{0}>".format(info["donor"]), inline=False
             )
-            e.description += f"\nTime Left: **{pretty_time}** \n"
-            e.description += f"Host: {host}"
 
-            if info["donor"]:
-                e.add_field(
-                    name="Donor", value="<@{0}>".format(info["donor"]), inline=False
-                )
+        reqs = await self.gen_req_message(message.guild, info["requirements"])
+        if reqs:
+            e.add_field(name="Requirements", value=reqs, inline=False)
 
-            requirements = info["requirements"]
+        e.timestamp = datetime.fromtimestamp(info["endtime"])
+        e.set_footer(text="Winners: {0} | Ends at".format(info["winners"]))
 
-            reqs = await self.gen_req_message(message.guild, info["requirements"])
-            if reqs:
-                e.add_field(name="Requirements", value=reqs, inline=False)
-
-            e.timestamp = datetime.fromtimestamp(info["endtime"])
-            e.set_footer(text="Winners: {0} | Ends at".format(info["winners"]))
+        content = data["startHeader"].replace("{giveawayEmoji}", data["emoji"])
+        rendered = (content, e.to_dict())
+        if self.rendered.get(messageid) == rendered:
+            self.edit_queue.stats["skipped"] += 1
+        else:
+            self.edit_queue.submit(
+                message,
+                on_sent=lambda: self.mark_rendered(messageid, rendered),
+                embed=e,
+                content=content,
+            )
 
+        emoji = data["emoji"]
+        if self.reacted.get(messageid) != emoji:
             try:
-                await message.edit(
-                    embed=e,
-                    content=data["startHeader"].replace(
-                        "{giveawayEmoji}", data["emoji"]
-                    ),
-                )
+                await message.add_reaction(emoji)
             except discord.NotFound:
+                self.stop_tracking(messageid)
                 return
+            self.reacted[messageid] = emoji
+
+        if self.giveaway_cache.get(messageid, False) == False:
+            return  # ended or cancelled while we were editing
+        if remaining.total_seconds() > 60:
+            # the last minute isn't refreshed, the end is already scheduled
+            self.scheduler.schedule(
+                messageid,
+                datetime.utcnow().timestamp() + round(remaining.total_seconds() / 4),
+            )
 
-            emoji = data["emoji"]
-            await message.add_reaction(emoji)
-            self.message_cache[str(messageid)] = message
-            if remaining.total_seconds() <= 60:
-                await asyncio.sleep(remaining.total_seconds())
-            else:
-                await asyncio.sleep(round(remaining.total_seconds() / 4))
+    def mark_rendered(self, messageid: str, rendered: tuple):
+        # only remembered once the edit went through, a failed one is retried
+        # on the next refresh even when nothing changed
+        if messageid in self.active_giveaways:
+            self.rendered[messageid] = rendered
+
+    def stop_tracking(self, messageid: str):
+        """Forget an ended or cancelled giveaway and stop refreshing it"""
+        self.giveaway_cache[messageid] = False
+        self.active_giveaways.pop(messageid, None)
+        self.active_ids.discard(int(messageid))
+        guild_id = self.active_guild_ids.pop(messageid, None)
+        if guild_id in self.guild_active:
+            self.guild_active[guild_id].pop(messageid, None)
+            if not self.guild_active[guild_id]:
+                del self.guild_active[guild_id]
+        self.rendered.pop(messageid, None)
+        self.reacted.pop(messageid, None)
+        self.entrants.pop(messageid, None)
+        self.synced.discard(messageid)
+        self.edit_queue.discard(int(messageid))
+        self.scheduler.cancel(messageid)
+
+    async def edit_not_found(self, message: discord.Message):
+        if str(message.id) in self.active_giveaways:
+            self.stop_tracking(str(message.id))
+
+    async def end_scheduled_giveaway(self, messageid: str):
+        info = self.active_giveaways.get(messageid)
+        if not info or self.giveaway_cache.get(messageid, False) == False:
+            return
+        await self.end_giveaway(int(messageid), info)
 
     async def end_giveaway(self, messageid: int, info, reroll: int = -1):
+        if reroll != -1:
+            return await self._end_giveaway(messageid, info, reroll)
+        # claimed before anything is awaited, so a scheduled end and g end
+        # (or a second scheduled end) can't both announce winners
+        if str(messageid) in self.ending:
+            return
+        self.ending.add(str(messageid))
+        try:
+            await self._end_giveaway(messageid, info)
+        finally:
+            self.ending.discard(str(messageid))
+
+    async def _end_giveaway(self, messageid: int, info, reroll: int = -1):
         channel = self.bot.get_channel(info["channel"])
 
         if not channel:
             return
 
+        # the entrant ledger can be used when it has been tracked since the
+        # giveaway started, otherwise the reactions have to be paged through
+        ledger = None
+        if reroll != -1:
+            ledger = await self.get_entrants(channel.guild.id, messageid)
+        elif str(messageid) in self.synced:
+            ledger = set(self.entrants[str(messageid)])
+
         message = self.bot._connection._get_message(int(messageid))
 
         if not message:
-            try:
-                message = await channel.fetch_message(messageid)
-            except discord.NotFound:
-                giveaways = await self.config.guild(channel.guild).giveaways()
-                giveaways.pop(str(messageid))
-                await self.config.guild(channel.guild).giveaways.set(giveaways)
-                return
-
-        giveaways = await self.config.guild(message.guild).giveaways()
-        giveaways[str(messageid)]["Ongoing"] = False
-        self.giveaway_cache[str(messageid)] = False
-        await self.config.guild(message.guild).giveaways.set(giveaways)
-
-        winners_list = []
-
-        users = []
-        data = await self.config.guild(message.guild).all()
-        for i, r in enumerate(message.reactions):
-            if str(r) == data["emoji"]:
-                users = await message.reactions[i].users().flatten()
-                break
-
-        if users == [None]:
-            return
-
-        bypassrole = await self.config.guild(message.guild).bypassrole()
+            if ledger is not None:
+                message = channel.get_partial_message(int(messageid))
+            else:
+                try:
+                    message = await channel.fetch_message(messageid)
+                except discord.NotFound:
+                    self.stop_tracking(str(messageid))
+                    await self.delete_giveaway(channel.guild.id, messageid)
+                    return
 
-        for user in users:
-            if user.mention in winners_list:
-                continue
-            if user.bot:
-                continue
-            if isinstance(user, discord.User):
-                continue
-            can_join = await self.can_join(user, info)
-            if can_join == True:
-                multi = await self.calculate_multi(user)
-                for i in range(multi):
-                    winners_list.append(user.mention)
+        self.stop_tracking(str(messageid))
+        await self.mark_ended(message.guild.id, messageid)
 
-        final_list = []
+        data = await self.get_guild_settings(message.guild)
+        if ledger is not None:
+            entrant_ids = set(ledger)
+            users = self.iter_entrants(message.guild, entrant_ids)
+        else:
+            entrant_ids = set()
+            reaction = discord.utils.find(
+                lambda r: str(r) == data["emoji"], message.reactions
+            )
+            users = self.iter_reactors(reaction, entrant_ids)
 
         if reroll == -1:
             winners = info["winners"]
         else:
             winners = reroll
 
-        for i in range(winners):
-            if len(winners_list) == 0:
-                continue
-            count = 0
-            win = choice(winners_list)
-            x = False
-            while win in final_list:
-                win = choice(winners_list)
-                count += 1
-                if count >= 6:
-                    x = True
-                    break  # for when it runs out of reactions etc.
-            if x:
-                continue
-            final_list.append(win)
+        winner_ids = await self.draw_winners(users, info, winners)
+        final_list = [f"<@{user_id}>" for user_id in winner_ids]
+        if reroll == -1 or ledger is None:
+            await self.save_entrants(message.guild.id, messageid, entrant_ids)
 
         if len(final_list) == 0:
             host = (
@@ -513,49 +930,62 @@ class Giveaways(commands.Cog):
                 f"The winners for the **{info['title']}** giveaway are \n{winners}\n{message.jump_url}"
             )
 
-            dmhost = await self.config.guild(message.guild).dmhost()
-            dmwin = await self.config.guild(message.guild).dmwin()
-            if dmhost:
-                host = message.guild.get_member(int(host))
-                if not host:
-                    pass
-                else:
-                    hostmessage = await self.config.guild(message.guild).hostmessage()
-                    e = discord.Embed(
-                        title=f"Your giveaway has ended",
-                        description=hostmessage.replace("{prize}", str(info["title"]))
-                        .replace("{winners}", winners)
-                        .replace("{guild}", message.guild.name)
-                        .replace("{url}", message.jump_url),
-                    )
-                    try:
-                        await host.send(embed=e)
-                    except discord.errors.Forbidden:
-                        pass
-            if dmwin:
-                winmessage = await self.config.guild(message.guild).winmessage()
-                for mention in final_list:
-                    mention = message.guild.get_member(
-                        int(mention.lstrip("<@!").lstrip("<@").rstrip(">"))
-                    )
-                    if not mention:
-                        continue
+            self.send_end_dms(message, info, data, winner_ids, winners)
 
-                    e = discord.Embed(
-                        title=f"You won a giveaway!",
-                        description=winmessage.replace("{prize}", str(info["title"]))
-                        .replace("{host}", f"<@{info['host']}>")
-                        .replace("{guild}", message.guild.name)
-                        .replace("{url}", message.jump_url),
-                    )
-                    try:
-                        await mention.send(embed=e)
-                    except discord.errors.Forbidden:
-                        pass
+    def send_end_dms(
+        self, message: discord.Message, info: dict, data: dict, winner_ids: list, winners: str
+    ):
+        """Queue the winner and host DMs of an ended giveaway
+
+        The host DM waits for the winner DMs so it can say how many got through.
+        """
+        guild = message.guild
+        host = guild.get_member(info["host"]) if data["dmhost"] else None
+
+        def dm_host(counts=None):
+            if not host:
+                return
+            e = discord.Embed(
+                title=f"Your giveaway has ended",
+                description=data["hostmessage"]
+                .replace("{prize}", str(info["title"]))
+                .replace("{winners}", winners)
+                .replace("{guild}", guild.name)
+                .replace("{url}", message.jump_url),
+            )
+            if counts is not None:
+                e.add_field(
+                    name="Winner DMs",
+                    value="Delivered: {delivered}\nDMs closed: {forbidden}\nFailed: {failed}".format(
+                        **counts
+                    ),
+                )
+            self.dm_dispatcher.submit([host], e)
+
+        async def report(counts):
+            dm_host(counts)
+
+        if not data["dmwin"]:
+            dm_host()
+            return
+
+        e = discord.Embed(
+            title=f"You won a giveaway!",
+            description=data["winmessage"]
+            .replace("{prize}", str(info["title"]))
+            .replace("{host}", f"<@{info['host']}>")
+            .replace("{guild}", guild.name)
+            .replace("{url}", message.jump_url),
+        )
+        members = filter(None, (guild.get_member(user_id) for user_id in winner_ids))
+        self.dm_dispatcher.submit(members, e, on_done=report)
 
     def cog_unload(self):
         self.giveaway_task.cancel()
-        for task in self.tasks:
+        self.scheduler.stop()
+        self.edit_queue.stop()
+        self.dm_dispatcher.stop()
+        for task in self.role_sync_tasks.values():
             task.cancel()
 
     async def send_final_message(self, ctx, ping, msg, embed):
@@ -568,7 +998,7 @@ class Giveaways(commands.Cog):
             else:
                 role = ctx.guild.get_role(int(pingrole))
                 if not role:
-                    await self.config.guild(ctx.guild).pingrole.clear()
+                    await self.clear_setting(ctx.guild, "pingrole")
                 else:
                     final_message += role.mention
                     final_message += " "
@@ -603,19 +1033,31 @@ class Giveaways(commands.Cog):
         previous = await self.config.member(user).donated()
         previous += amt
         await self.config.member(user).donated.set(previous)
-        await self.update_donator_roles(user)
-
-    async def update_donator_roles(self, member: discord.Member) -> None:
-        roles = await self.config.guild(member.guild).donatorroles()
-        donated = await self.config.member(member).donated()
-
-        for role_id, amount_required in roles.items():
-            role = member.guild.get_role(int(role_id))
-            if not role:
-                all_roles = await self.config.guild(member.guild).donatorroles()
-                all_roles.pop(role_id)
-                await self.config.guild(member.guild).roles.set(all_roles)
-                continue
+        self.donation_leaderboards.update(user.guild.id, user.id, previous)
+        await self.update_donator_roles(user, previous)
+
+    async def load_donations(self, guild: discord.Guild) -> dict:
+        return {
+            int(member_id): data["donated"]
+            for member_id, data in (await self.config.all_members(guild)).items()
+        }
+
+    async def get_donator_roles(self, guild: discord.Guild) -> dict:
+        """The guilds donator roles as {role: amount needed}, forgetting deleted ones"""
+        settings = (await self.get_guild_settings(guild))["donatorroles"]
+        roles = {}
+        for role_id, amount_required in settings.items():
+            role = guild.get_role(int(role_id))
+            if role:
+                roles[role] = amount_required
+        if len(roles) != len(settings):
+            await self.set_setting(
+                guild, "donatorroles", {str(r.id): a for r, a in roles.items()}
+            )
+        return roles
+
+    async def update_donator_roles(self, member: discord.Member, donated: int) -> None:
+        for role, amount_required in (await self.get_donator_roles(member.guild)).items():
             if donated < amount_required:
                 if role not in member.roles:
                     continue
@@ -631,6 +1073,71 @@ class Giveaways(commands.Cog):
                 except discord.errors.Forbidden:
                     pass
 
+    async def sync_donator_roles(self, guild: discord.Guild) -> tuple:
+        """Give every member exactly the donator roles their donations are worth
+
+        The targets are worked out from one snapshot of the member data, only
+        members whose roles differ get edited, ``ROLE_SYNC_BATCH_SIZE`` at a time.
+        Returns how many roles were added or removed and how many edits failed.
+        """
+        me = guild.me
+        roles = {
+            role: amount
+            for role, amount in (await self.get_donator_roles(guild)).items()
+            if role < me.top_role and not role.managed
+        }
+        if not roles or not me.guild_permissions.manage_roles:
+            return 0, 0
+        donations = await self.load_donations(guild)
+
+        changes = []
+        for member in guild.members:
+            if member.bot:
+                continue
+            donated = donations.get(member.id, 0)
+            current = set(member.roles)
+            to_add = [r for r, a in roles.items() if donated >= a and r not in current]
+            to_remove = [r for r, a in roles.items() if donated < a and r in current]
+            if to_add or to_remove:
+                changes.append((member, to_add, to_remove))
+
+        applied = failed = 0
+        for i, (member, to_add, to_remove) in enumerate(changes):
+            if i and i % ROLE_SYNC_BATCH_SIZE == 0:
+                await asyncio.sleep(1)
+            try:
+                if to_add:
+                    await member.add_roles(*to_add, reason="Donator role sync")
+                    applied += len(to_add)
+                if to_remove:
+                    await member.remove_roles(*to_remove, reason="Donator role sync")
+                    applied += len(to_remove)
+            except discord.HTTPException:
+                failed += 1
+        return applied, failed
+
+    async def run_role_sync(self, ctx: commands.Context):
+        # a newer sync for the guild replaces one that's still going since the
+        # targets it worked out are stale now
+        task = self.role_sync_tasks.get(ctx.guild.id)
+        if task:
+            task.cancel()
+        task = self.role_sync_tasks[ctx.guild.id] = asyncio.create_task(
+            self.sync_donator_roles(ctx.guild)
+        )
+        try:
+            applied, failed = await task
+        except asyncio.CancelledError:
+            return
+        finally:
+            if self.role_sync_tasks.get(ctx.guild.id) is task:
+                del self.role_sync_tasks[ctx.guild.id]
+
+        message = f"Donator roles synced, {applied} role changes were made"
+        if failed:
+            message += f" and {failed} members couldn't be updated"
+        await ctx.send(message)
+
     async def gen_req_message(self, guild: discord.Guild, requirements: dict) -> str:
         reqs = ""
         if requirements["roles"]:
@@ -660,8 +1167,11 @@ class Giveaways(commands.Cog):
             if not server:
                 pass
             else:
-                invite = await self.create_invite(server)
-                reqs += "Must join **[{server.name}]({invite})**\n"
+                invite = await self.invite_cache.get(server)
+                if invite:
+                    reqs += f"Must join **[{server.name}]({invite})**\n"
+                else:
+                    reqs += f"Must join **{server.name}**\n"
 
         if requirements["invites"]:
             reqs += f"Minimum number of invites: {requirements['invites']}"
@@ -671,7 +1181,7 @@ class Giveaways(commands.Cog):
                 f"Minimum shared dankmemer coins in server: {requirements['shared']}\n"
             )
 
-        bypassroles = await self.config.guild(guild).bypassrole()
+        bypassroles = (await self.get_guild_settings(guild))["bypassrole"]
 
         if bypassroles:
             roles = []
@@ -706,7 +1216,7 @@ class Giveaways(commands.Cog):
         if role.id in roles:
             return await ctx.send("This role is already a manager")
         roles.append(role.id)
-        await self.config.guild(ctx.guild).manager.set(roles)
+        await self.set_setting(ctx.guild, "manager", roles)
         await ctx.send("Added to the manager roles")
 
     @manager.command(name="remove")
@@ -716,7 +1226,7 @@ class Giveaways(commands.Cog):
         if role.id not in roles:
             return await ctx.send("This role is not a manager")
         roles.remove(role.id)
-        await self.config.guild(ctx.guild).manager.set(roles)
+        await self.set_setting(ctx.guild, "manager", roles)
         await ctx.send("Removed from the manager roles")
 
     @giveawayset.command(name="pingrole")
@@ -726,7 +1236,7 @@ class Giveaways(commands.Cog):
         if not role:
             return await ctx.send("This isn't a role")
 
-        await self.config.guild(ctx.guild).pingrole.set(role.id)
+        await self.set_setting(ctx.guild, "pingrole", role.id)
 
         await ctx.send(f"**{role.name}** will now be pinged if a ping is specified")
 
@@ -737,10 +1247,10 @@ class Giveaways(commands.Cog):
     async def defaultrequirement(self, ctx, role: Optional[discord.Role] = None):
         """The default requirement for giveaways"""
         if not role:
-            await self.config.guild(ctx.guild).default_req.clear()
+            await self.clear_setting(ctx.guild, "default_req")
             return await ctx.send("I will no longer have default requirements")
 
-        await self.config.guild(ctx.guild).default_req.set(role.id)
+        await self.set_setting(ctx.guild, "default_req", role.id)
 
         await ctx.send(f"The default role requirement is now **{role.name}**")
 
@@ -749,12 +1259,12 @@ class Giveaways(commands.Cog):
     async def cmd_delete(self, ctx, delete: Optional[bool] = True):
         """Toggle whether to delete the giveaway creation message"""
         if not delete:
-            await self.config.guild(ctx.guild).delete.set(False)
+            await self.set_setting(ctx.guild, "delete", False)
             await ctx.send(
                 "I will no longer delete invocation messages when creating giveaways"
             )
         else:
-            await self.config.guild(ctx.guild).delete.set(True)
+            await self.set_setting(ctx.guild, "delete", True)
             await ctx.send(
                 "I will now delete invocation messages when creating giveaways"
             )
@@ -764,10 +1274,10 @@ class Giveaways(commands.Cog):
     async def dmhost(self, ctx, dmhost: Optional[bool] = True):
         """Toggle whether to DM the host when the giveaway ends"""
         if not dmhost:
-            await self.config.guild(ctx.guild).dmhost.set(False)
+            await self.set_setting(ctx.guild, "dmhost", False)
             await ctx.send("I will no longer dm hosts")
         else:
-            await self.config.guild(ctx.guild).dmhost.set(True)
+            await self.set_setting(ctx.guild, "dmhost", True)
             await ctx.send("I will now dm hosts")
 
     @giveawayset.command(name="dmwin")
@@ -775,10 +1285,10 @@ class Giveaways(commands.Cog):
     async def dmwin(self, ctx, dmwin: Optional[bool] = True):
         """Toggles whether to DM the winners of the giveaway"""
         if not dmwin:
-            await self.config.guild(ctx.guild).dmwin.set(False)
+            await self.set_setting(ctx.guild, "dmwin", False)
             await ctx.send("I will no longer dm winners")
         else:
-            await self.config.guild(ctx.guild).dmwin.set(True)
+            await self.set_setting(ctx.guild, "dmwin", True)
             await ctx.send("I will now dm winners")
 
     @giveawayset.group(
@@ -796,7 +1306,7 @@ class Giveaways(commands.Cog):
         if role.id in roles:
             return await ctx.send("This role already bypasses giveaway requirements")
         roles.append(role.id)
-        await self.config.guild(ctx.guild).bypassrole.set(roles)
+        await self.set_setting(ctx.guild, "bypassrole", roles)
         await ctx.send("Added to the bypass roles")
 
     @bypassrole.command(name="remove")
@@ -806,7 +1316,7 @@ class Giveaways(commands.Cog):
         if role.id not in roles:
             return await ctx.send("This role does not bypass requirements")
         roles.remove(role.id)
-        await self.config.guild(ctx.guild).bypassrole.set(roles)
+        await self.set_setting(ctx.guild, "bypassrole", roles)
         await ctx.send("Removed from the bypass roles")
 
     @giveawayset.group(name="blacklistrole", aliases=["blrole"])
@@ -823,7 +1333,7 @@ class Giveaways(commands.Cog):
         if role.id in roles:
             return await ctx.send("This role is already blacklisted")
         roles.append(role.id)
-        await self.config.guild(ctx.guild).blacklist.set(roles)
+        await self.set_setting(ctx.guild, "blacklist", roles)
         await ctx.send("Added to the blacklisted roles")
 
     @blacklistrole.command(name="remove")
@@ -834,7 +1344,7 @@ class Giveaways(commands.Cog):
         if role.id not in roles:
             return await ctx.send("This role is not blacklisted")
         roles.remove(role.id)
-        await self.config.guild(ctx.guild).blacklist.set(roles)
+        await self.set_setting(ctx.guild, "blacklist", roles)
         await ctx.send("Removed from the blacklisted roles")
 
     @giveawayset.command(name="multi", aliases=["multiplier"])
@@ -851,6 +1361,7 @@ class Giveaways(commands.Cog):
                 "Sorry, the max multiplier is 500 to make giveaways more efficient"
             )
         await self.config.role(role).multiplier.set(multi)
+        self.multiplier_cache.pop(ctx.guild.id, None)
         await ctx.send(f"`{role}` will now have a multilpier of {multi}")
 
     @giveawayset.command(name="settings", aliases=["showsettings", "stats"])
@@ -898,7 +1409,10 @@ class Giveaways(commands.Cog):
                 else "None"
             ),
         )
-        e.add_field(name="Total Giveaways", value=len(data["giveaways"].keys()))
+        e.add_field(
+            name="Total Giveaways",
+            value=len(await self.get_all_giveaways(ctx.guild.id)),
+        )
         e.add_field(name="DM on win", value=data["dmwin"])
         e.add_field(name="DM host", value=data["dmhost"])
         e.add_field(name="Autodelete invocation messages", value=data["delete"])
@@ -948,10 +1462,10 @@ class Giveaways(commands.Cog):
         {url}: The jump url
         """
         if not message:
-            await self.config.guild(ctx.guild).hostmessage.clear()
+            await self.clear_setting(ctx.guild, "hostmessage")
             await ctx.send("I've reset your servers host message")
         else:
-            await self.config.guild(ctx.guild).hostmessage.set(message)
+            await self.set_setting(ctx.guild, "hostmessage", message)
             await ctx.send(f"Your message is now `{message}`")
 
     @giveawayset.command(name="winmessage")
@@ -965,10 +1479,10 @@ class Giveaways(commands.Cog):
         {prize}: The title/prize of the giveaway
         {url}: The jump url"""
         if not message:
-            await self.config.guild(ctx.guild).winmessage.clear()
+            await self.clear_setting(ctx.guild, "winmessage")
             await ctx.send("I've reset your servers win message")
         else:
-            await self.config.guild(ctx.guild).winmessage.set(message)
+            await self.set_setting(ctx.guild, "winmessage", message)
             await ctx.send(f"Your message is now `{message}`")
 
     @giveawayset.command(name="startheader")
@@ -978,10 +1492,10 @@ class Giveaways(commands.Cog):
         Variables
         {giveawayEmoji}: Your servers giveaway emoji, defaults to :tada: if you haven't set one"""
         if not message:
-            await self.config.guild(ctx.guild).startHeader.clear()
+            await self.clear_setting(ctx.guild, "startHeader")
             await ctx.send("I've reset your servers startheader")
         else:
-            await self.config.guild(ctx.guild).startHeader.set(message)
+            await self.set_setting(ctx.guild, "startHeader", message)
             await ctx.send(f"Your startheader is now `{message}`")
 
     @giveawayset.command(name="endheader")
@@ -991,10 +1505,10 @@ class Giveaways(commands.Cog):
         Variables
         {giveawayEmoji}: Your servers giveaway emoji, defaults to :tada: if you haven't set one"""
         if not message:
-            await self.config.guild(ctx.guild).endHeader.clear()
+            await self.clear_setting(ctx.guild, "endHeader")
             await ctx.send("I've reset your servers endheader")
         else:
-            await self.config.guild(ctx.guild).endHeader.set(message)
+            await self.set_setting(ctx.guild, "endHeader", message)
             await ctx.send(f"Your endheader is now `{message}`")
 
     @giveawayset.command(name="description")
@@ -1004,10 +1518,10 @@ class Giveaways(commands.Cog):
         Variables:
         {emoji}: The emoji you use for giveaways"""
         if not message:
-            await self.config.guild(ctx.guild).description.clear()
+            await self.clear_setting(ctx.guild, "description")
             await ctx.send("I've reset your servers embed description")
         else:
-            await self.config.guild(ctx.guild).description.set(message)
+            await self.set_setting(ctx.guild, "description", message)
             await ctx.send(f"Your embed description is now `{message}`")
 
     @giveawayset.command(name="emoji")
@@ -1015,10 +1529,10 @@ class Giveaways(commands.Cog):
     async def emoji(self, ctx, emoji: Union[discord.Emoji, discord.PartialEmoji, None]):
         """Set the custom emoji to use for giveaways"""
         if not emoji:
-            await self.config.guild(ctx.guild).emoji.clear()
+            await self.clear_setting(ctx.guild, "emoji")
             await ctx.send("I will no longer use custom emojis.")
         else:
-            await self.config.guild(ctx.guild).emoji.set(str(emoji))
+            await self.set_setting(ctx.guild, "emoji", str(emoji))
             await ctx.send(f"Your emoji is now {str(emoji)}")
 
     @giveawayset.group(aliases=["donor", "donatorroles", "donatorrole"])
@@ -1031,8 +1545,9 @@ class Giveaways(commands.Cog):
         """Edit or Add a donator role"""
         roles = await self.config.guild(ctx.guild).donatorroles()
         roles[str(role.id)] = amount
-        await self.config.guild(ctx.guild).donatorroles.set(roles)
-        await ctx.send("Updated")
+        await self.set_setting(ctx.guild, "donatorroles", roles)
+        await ctx.send("Updated, syncing donator roles now")
+        await self.run_role_sync(ctx)
 
     @donator.command()
     async def remove(self, ctx: commands.Context, role: discord.Role):
@@ -1043,9 +1558,15 @@ class Giveaways(commands.Cog):
         except KeyError:
             return await ctx.send("This role isn't a donator role")
 
-        await self.config.guild(ctx.guild).donatorroles.set(roles)
+        await self.set_setting(ctx.guild, "donatorroles", roles)
         await ctx.send(f"Removed `{role.name}` as a donator role")
 
+    @donator.command(name="sync", aliases=["reconcile"])
+    async def donator_sync(self, ctx: commands.Context):
+        """Add and remove donator roles for everyone based on what they've donated"""
+        async with ctx.typing():
+            await self.run_role_sync(ctx)
+
     @donator.command(name="settings", aliases=["show", "showsettings"])
     async def _settings(self, ctx: commands.Context):
         roles = await self.config.guild(ctx.guild).donatorroles()
@@ -1089,6 +1610,8 @@ class Giveaways(commands.Cog):
             return await ctx.send("This user is already blacklisted...")
         bl.append(user)
         await self.config.secretblacklist.set(bl)
+        self.secretblacklist_cache = set(bl)
+        self.eligibility_cache.clear()
         await ctx.send("Added to the blacklist")
 
     @secretblacklist.command(name="remove")
@@ -1107,13 +1630,24 @@ class Giveaways(commands.Cog):
             return await ctx.send("This user is not blacklisted...")
         bl.remove(user)
         await self.config.secretblacklist.set(bl)
+        self.secretblacklist_cache = set(bl)
+        self.eligibility_cache.clear()
         await ctx.send("Removed from the blacklist")
 
+    @giveaway.command(name="concurrency")
+    @commands.is_owner()
+    async def concurrency(self, ctx, amount: int = 10):
+        """Set how many entrants are checked at once when a giveaway ends"""
+        if amount < 1 or amount > 100:
+            return await ctx.send("The concurrency needs to be between 1 and 100")
+        await self.config.eligibility_concurrency.set(amount)
+        await ctx.send(f"I will now check {amount} entrants at once")
+
     @giveaway.command(name="clearended")
     @commands.admin_or_permissions(manage_guild=True)
     async def clearended(self, ctx, *dontclear):
         """Clear the giveaways that have already ended in your server. Put all the message ids you dont want to clear after this to not clear them"""
-        gaws = await self.config.guild(ctx.guild).giveaways()
+        gaws = await self.get_all_giveaways(ctx.guild.id)
         to_delete = []
         for messageid, info in gaws.items():
             if str(messageid) in dontclear:
@@ -1123,7 +1657,8 @@ class Giveaways(commands.Cog):
 
         for messageid in to_delete:
             gaws.pop(messageid)
-        await self.config.guild(ctx.guild).giveaways.set(gaws)
+            await self.config.custom("entrants", str(ctx.guild.id), messageid).clear()
+        await self.config.custom("giveaway", str(ctx.guild.id)).set(gaws)
         await ctx.send(f"Successfully cleared {len(to_delete)} inactive giveaways")
 
     @giveaway.command(name="help")
@@ -1271,9 +1806,6 @@ class Giveaways(commands.Cog):
             return await ctx.send(str(exc))
 
         guild = ctx.guild
-        data = await self.config.guild(guild).all()
-
-        gaws = await self.config.guild(guild).giveaways()
 
         if not requirements:
             requirements = {
@@ -1313,19 +1845,24 @@ class Giveaways(commands.Cog):
 
         msg = str(gaw_msg.id)
 
-        gaws[msg] = {}
-        gaws[msg]["host"] = ctx.author.id
-        gaws[msg]["Ongoing"] = True
-        gaws[msg]["requirements"] = requirements
-        gaws[msg]["winners"] = winners
-        gaws[msg]["title"] = title
-        gaws[msg]["endtime"] = datetime.utcnow().timestamp() + int(time)
-        gaws[msg]["channel"] = ctx.channel.id
-        gaws[msg]["donor"] = flags["donor"]
+        info = {}
+        info["host"] = ctx.author.id
+        info["Ongoing"] = True
+        info["requirements"] = requirements
+        info["winners"] = winners
+        info["title"] = title
+        info["endtime"] = datetime.utcnow().timestamp() + int(time)
+        info["channel"] = ctx.channel.id
+        info["donor"] = flags["donor"]
 
-        await self.config.guild(guild).giveaways.set(gaws)
+        await self.save_giveaway(guild.id, msg, info)
 
-        delete = await self.config.guild(ctx.guild).delete()
+        self.message_cache[str(msg)] = gaw_msg
+        self.entrants[str(msg)] = set()
+        self.synced.add(str(msg))
+        self.start_giveaway(guild.id, int(msg), info)
+
+        delete = (await self.get_guild_settings(ctx.guild))["delete"]
 
         if ctx.channel.permissions_for(ctx.me).manage_messages and delete:
             try:
@@ -1372,10 +1909,6 @@ class Giveaways(commands.Cog):
             except discord.HTTPException:
                 await ctx.send("I can't pin this message becuase the channel has 50 pinned messages already")
 
-        self.message_cache[str(msg)] = gaw_msg
-        self.giveaway_cache[str(msg)] = True
-
-        self.tasks.append(asyncio.create_task(self.start_giveaway(int(msg), gaws[msg])))
 
     @giveaway.command(name="end")
     async def end(self, ctx, messageid: Optional[IntOrLink] = None):
@@ -1387,8 +1920,8 @@ class Giveaways(commands.Cog):
                 msg = ctx.message.reference.resolved
                 if isinstance(msg, discord.Message):
                     messageid = msg.id
-        gaws = await self.config.guild(ctx.guild).giveaways()
         if messageid is None:
+            gaws = await self.get_active_giveaways(ctx.guild.id)
             for messageid, info in list(gaws.items())[::-1]:
                 if info["channel"] == ctx.channel.id and info["Ongoing"]:
                     await self.end_giveaway(messageid, info)
@@ -1396,15 +1929,15 @@ class Giveaways(commands.Cog):
             return await ctx.send(
                 "There aren't any giveaways in this channel, specify a message id/link to end another channels giveaways"
             )
-        gaws = await self.config.guild(ctx.guild).giveaways()
-        if str(messageid) not in gaws:
+        info = await self.get_giveaway(ctx.guild.id, messageid)
+        if not info:
             return await ctx.send("This isn't a giveaway.")
-        elif gaws[str(messageid)]["Ongoing"] == False:
+        elif info["Ongoing"] == False:
             return await ctx.send(
                 f"This giveaway has ended. You can reroll it with `{ctx.prefix}g reroll {messageid}`"
             )
         else:
-            await self.end_giveaway(messageid, gaws[str(messageid)])
+            await self.end_giveaway(messageid, info)
 
     @giveaway.command(name="reroll")
     async def reroll(
@@ -1418,8 +1951,8 @@ class Giveaways(commands.Cog):
                 msg = ctx.message.reference.resolved
                 if isinstance(msg, discord.Message):
                     messageid = msg.id
-        gaws = await self.config.guild(ctx.guild).giveaways()
         if not messageid:
+            gaws = await self.get_all_giveaways(ctx.guild.id)
             for messageid, info in list(gaws.items())[::-1]:
                 if info["channel"] == ctx.channel.id and info["Ongoing"] == False:
                     await self.end_giveaway(messageid, info)
@@ -1429,14 +1962,15 @@ class Giveaways(commands.Cog):
             )
         elif winners <= 0:
             return await ctx.send("You can't have no winners.")
-        if str(messageid) not in gaws:
+        info = await self.get_giveaway(ctx.guild.id, messageid)
+        if not info:
             return await ctx.send("This giveaway does not exist")
-        elif gaws[str(messageid)]["Ongoing"] == True:
+        elif info["Ongoing"] == True:
             return await ctx.send(
                 f"This giveaway has not yet ended, you can end it with `{ctx.prefix}g end {messageid}`"
             )
         else:
-            await self.end_giveaway(messageid, gaws[str(messageid)], winners)
+            await self.end_giveaway(messageid, info, winners)
 
     @giveaway.command(name="ping")
     async def g_ping(self, ctx, *, message: str = None):
@@ -1453,7 +1987,7 @@ class Giveaways(commands.Cog):
                 return
         role = ctx.guild.get_role(pingrole)
         if not role:
-            await self.config.guild(ctx.guild).pingrole.clear()
+            await self.clear_setting(ctx.guild, "pingrole")
             try:
                 return await ctx.send(message, allowed_mentions=m)
             except discord.HTTPException:
@@ -1473,9 +2007,12 @@ class Giveaways(commands.Cog):
             counter = 0
             if cacheglobal == "--global":
                 all_guilds = await self.config.all_guilds()
-                for guild_id, data in all_guilds.items():
+                for guild_id in all_guilds.keys():
                     counter = 0
-                    giveaways = data["giveaways"]
+                    if active:
+                        giveaways = await self.get_active_giveaways(int(guild_id))
+                    else:
+                        giveaways = await self.get_all_giveaways(int(guild_id))
                     for messageid, info in giveaways.items():
                         if active:
                             if not info["Ongoing"]:
@@ -1500,9 +2037,11 @@ class Giveaways(commands.Cog):
                         continue
                     e.description += f"Cached {counter} messages in {guild.name}\n"
             else:
-                for messageid, info in (
-                    await self.config.guild(ctx.guild).giveaways()
-                ).items():
+                if active:
+                    giveaways = await self.get_active_giveaways(ctx.guild.id)
+                else:
+                    giveaways = await self.get_all_giveaways(ctx.guild.id)
+                for messageid, info in giveaways.items():
                     if active:
                         if not info["Ongoing"]:
                             continue
@@ -1525,71 +2064,161 @@ class Giveaways(commands.Cog):
 
         await ctx.send(embed=e)
 
+    @giveaway.command(name="warmup")
+    @commands.is_owner()
+    async def g_warmup(self, ctx):
+        """See how restoring the active giveaways after the last restart went"""
+        status = self.warmup
+        if status["duration"] is not None:
+            duration = f"{round(status['duration'], 2)}s"
+        elif status["started"] is not None:
+            duration = f"{round(time.monotonic() - status['started'], 2)}s so far"
+        else:
+            duration = "Not started"
+        e = discord.Embed(
+            title="Giveaway Warm-up",
+            description=(
+                f"State: **{status['state']}**\n"
+                f"Guilds: {status['guilds']}\n"
+                f"Channels: {status['channels']}\n"
+                f"Restored: {status['restored']}/{status['giveaways']}\n"
+                f"Skipped (channel not found): {status['skipped']}\n"
+                f"Duration: {duration}"
+            ),
+            color=await ctx.embed_color(),
+        )
+        await ctx.send(embed=e)
+
+    @giveaway.command(name="stats")
+    @commands.is_owner()
+    async def g_stats(self, ctx):
+        """View cache and scheduling stats for giveaways"""
+        e = discord.Embed(title="Giveaway Stats", color=await ctx.embed_color())
+        e.add_field(
+            name="Scheduler",
+            value="Scheduled: {0}\nRefreshes in flight: {1}/{2}\nWakeups: {3}".format(
+                len(self.scheduler),
+                self.scheduler.in_flight,
+                self.scheduler.max_edits,
+                self.scheduler.wakeups,
+            ),
+        )
+        e.add_field(
+            name="Message Edits",
+            value="Sent: {sent}\nSkipped: {skipped}\nDeferred: {deferred}".format(
+                **self.edit_queue.stats
+            ),
+        )
+        e.add_field(
+            name="Direct Messages",
+            value="Queued: {0}\nDelivered: {delivered}\nDMs closed: {forbidden}\n"
+            "Failed: {failed}\nRetried: {retried}".format(
+                len(self.dm_dispatcher), **self.dm_dispatcher.stats
+            ),
+        )
+        e.add_field(
+            name="Server Invites",
+            value="Cached: {0}\nHits: {hits}\nCreated: {created}\nValidated: {validated}".format(
+                len(self.invite_cache), **self.invite_cache.stats
+            ),
+        )
+        e.add_field(
+            name="Settings Cache",
+            value="Hits: {hits}\nMisses: {misses}".format(**self.settings_cache_stats),
+        )
+        cache = self.eligibility_cache
+        lookups = cache.hits + cache.misses
+        e.add_field(
+            name="Eligibility Cache",
+            value="Entries: {0}\nHits: {1}\nMisses: {2}\nHit rate: {3}%".format(
+                len(cache),
+                cache.hits,
+                cache.misses,
+                round(cache.hits / lookups * 100, 1) if lookups else 0,
+            ),
+        )
+        rejections = "\n".join(
+            f"{name}: {amount}" for name, amount in self.rejection_stats.most_common()
+        )
+        e.add_field(name="Rejections", value=rejections or "None", inline=False)
+        await ctx.send(embed=e)
+
     @giveaway.command(name="list")
     @commands.cooldown(1, 30, commands.BucketType.member)
     @commands.max_concurrency(2, commands.BucketType.user)
     async def g_list(self, ctx, can_join: bool = False):
         """List the giveways in the server. Specify True for can_join paramater to only list the ones you can join"""
-        async with ctx.typing():
+        giveaways = list(self.guild_active.get(ctx.guild.id, {}).items())
+        if not giveaways:
+            return await ctx.send("There are no active giveaways in this server")
+
+        page_count = -(-len(giveaways) // LIST_PAGE_SIZE)
+
+        async def render(page: int) -> discord.Embed:
+            chunk = giveaways[page * LIST_PAGE_SIZE : (page + 1) * LIST_PAGE_SIZE]
+            verdicts = await asyncio.gather(
+                *(self.can_join(ctx.author, info) for _, info in chunk)
+            )
             giveaway_list = []
-            bypassrole = await self.config.guild(ctx.guild).bypassrole()
-            gaws = await self.config.guild(ctx.guild).giveaways()
-            for messageid, info in gaws.items():
-                messageid = str(messageid)
-                if not info["Ongoing"]:
+            for (messageid, info), verdict in zip(chunk, verdicts):
+                if can_join and verdict != True:
                     continue
-                if not can_join:
-                    jump_url = f"https://discord.com/channels/{ctx.guild.id}/{info['channel']}/{messageid}"
+                jump_url = f"https://discord.com/channels/{ctx.guild.id}/{info['channel']}/{messageid}"
+                header = f"[{info['title']}]({jump_url})"
+                header += " | Winners: {0} | Host: <@{1}>".format(
+                    info["winners"], info["host"]
+                )
+                header += " | Channel: <#{0}> | ID: {1}".format(
+                    info["channel"], messageid
+                )
+                if verdict == True:
+                    header += " :white_check_mark: You can join this giveaway\n"
+                elif verdict:
+                    header += f" :octagonal_sign: {verdict[1].replace('[JUMP_URL_HERE]', 'this')}\n"
+                else:
+                    header += " :octagonal_sign: You can't join this giveaway\n"
+                giveaway_list.append(header)
 
-                    header = f"[{info['title']}]({jump_url})"
-                    header += " | Winners: {0} | Host: <@{1}>".format(
-                        info["winners"], info["host"]
-                    )
-                    header += " | Channel: <#{0}> | ID: {1}".format(
-                        info["channel"], messageid
-                    )
-                    can_join_var = await self.can_join(ctx.author, info)
-                    if can_join_var == True:
-                        header += " :white_check_mark: You can join this giveaway\n"
-                        giveaway_list.append(header)
-                        continue
-                    header += f" :octagonal_sign: {can_join_var[1].replace('[JUMP_URL_HERE]', 'this')}\n"
+            return discord.Embed(
+                title=f"Giveaways Page {page + 1}/{page_count}",
+                description="\n".join(giveaway_list)[:2048]
+                or "You can't join any of the giveaways on this page",
+                color=discord.Color.green(),
+            )
 
-                    giveaway_list.append(header)
-                else:
-                    jump_url = f"https://discord.com/channels/{ctx.guild.id}/{info['channel']}/{messageid}`"
-                    header = f"[{info['title']}]({jump_url})"
-                    header += " | Winners: {0} | Host: <@{1}>".format(
-                        info["winners"], info["host"]
-                    )
-                    header += " | Channel: <#{0}> | ID: {1}".format(
-                        info["channel"], messageid
-                    )
-                    can_join_var = await self.can_join(ctx.author, info)
-                    if can_join_var == True:
-                        header += " :white_check_mark: You can join this giveaway\n"
-                        giveaway_list.append(header)
-
-        formatted_giveaways = "\n".join(giveaway_list)
-        if len(formatted_giveaways) > 2048:
-            pages = list(pagify(formatted_giveaways))
-            embeds = []
+        async with ctx.typing():
+            first = await render(0)
 
-            for i, page in enumerate(pages, start=1):
-                e = discord.Embed(
-                    title=f"Giveaways Page {i}/{len(pages)}",
-                    description=page,
-                    color=discord.Color.green(),
-                )
-                embeds.append(e)
-            await menu(ctx, embeds, DEFAULT_CONTROLS)
-        else:
-            e = discord.Embed(
-                title="Giveaway Page 1",
-                description=formatted_giveaways,
+        if page_count == 1:
+            return await ctx.send(embed=first)
+
+        # menu wants every page up front, the rest stay placeholders until
+        # they are flipped to
+        pages = [first] + [
+            discord.Embed(
+                title=f"Giveaways Page {page + 1}/{page_count}",
+                description="Loading...",
                 color=discord.Color.green(),
             )
-            await ctx.send(embed=e)
+            for page in range(1, page_count)
+        ]
+        rendered = {0}
+
+        async def turn_page(ctx, pages, controls, message, page, timeout, emoji):
+            step = 1 if DEFAULT_CONTROLS[emoji] is next_page else -1
+            target = (page + step) % len(pages)
+            if target not in rendered:
+                pages[target] = await render(target)
+                rendered.add(target)
+            return await DEFAULT_CONTROLS[emoji](
+                ctx, pages, controls, message, page, timeout, emoji
+            )
+
+        controls = {
+            emoji: turn_page if func in (next_page, prev_page) else func
+            for emoji, func in DEFAULT_CONTROLS.items()
+        }
+        await menu(ctx, pages, controls)
 
     @giveaway.command(name="cancel")
     async def cancel(self, ctx, giveaway: Optional[IntOrLink] = None):
@@ -1601,8 +2230,8 @@ class Giveaways(commands.Cog):
                 msg = ctx.message.reference.resolved
                 if isinstance(msg, discord.Message):
                     giveaway = msg.id
-        gaws = await self.config.guild(ctx.guild).giveaways()
         if not giveaway:
+            gaws = await self.get_active_giveaways(ctx.guild.id)
             for messageid, info in list(gaws.items())[::-1]:
                 if info["Ongoing"] and info["channel"] == ctx.channel.id:
                     chan = self.bot.get_channel(info["channel"])
@@ -1630,10 +2259,8 @@ class Giveaways(commands.Cog):
                         await m.edit(content="Giveaway Cancelled", embed=e)
                     except discord.NotFound:
                         continue
-                    info["Ongoing"] = False
-                    gaws[messageid] = info
-                    await self.config.guild(ctx.guild).giveaways.set(gaws)
-                    self.giveaway_cache[messageid] = False
+                    await self.mark_ended(ctx.guild.id, messageid)
+                    self.stop_tracking(messageid)
                     return await ctx.send(
                         "Cancelled the giveaway for **{0}**".format(info["title"])
                     )
@@ -1642,12 +2269,12 @@ class Giveaways(commands.Cog):
                 "There are no active giveaways in this channel to be cancelled, specify a message id/link after this in another channel to cancel one"
             )
         giveaway = str(giveaway)
-        if giveaway not in gaws.keys():
+        data = await self.get_giveaway(ctx.guild.id, giveaway)
+        if not data:
             return await ctx.send("This giveaway does not exist")
-        if not gaws[giveaway]["Ongoing"]:
+        if not data["Ongoing"]:
             return await ctx.send("This giveaway has ended")
 
-        data = gaws[giveaway]
         chan = self.bot.get_channel(data["channel"])
         if not chan:
             return await ctx.send("This message is no longer available")
@@ -1658,9 +2285,8 @@ class Giveaways(commands.Cog):
         except discord.NotFound:
             return await ctx.send("Couldn't find this giveaway")
 
-        gaws[giveaway]["Ongoing"] = False
-        self.giveaway_cache[giveaway] = False
-        await self.config.guild(ctx.guild).giveaways.set(gaws)
+        self.stop_tracking(giveaway)
+        await self.mark_ended(ctx.guild.id, giveaway)
 
         e = discord.Embed(
             title=data["title"],
@@ -1677,8 +2303,6 @@ class Giveaways(commands.Cog):
             await m.edit(content="Giveaway Cancelled", embed=e)
         except discord.NotFound:
             return await ctx.send("I couldn't find this giveaway")
-        gaws[giveaway]["Ongoing"] = False
-        await self.config.guild(ctx.guild).giveaways.set(gaws)
         await ctx.send("Cancelled the giveaway for **{0}**".format(data["title"]))
 
 
@@ -1724,13 +2348,8 @@ class Giveaways(commands.Cog):
         """View the top donators"""
         if amt < 1:
             return await ctx.send("no")
-        member_data = await self.config.all_members(ctx.guild)
-        sorted_data = [
-            (member, data["donated"])
-            for member, data in member_data.items()
-            if data["donated"] > 0 and ctx.guild.get_member(int(member)) is not None
-        ]
-        ordered_data = sorted(sorted_data[:amt], key=lambda m: m[1], reverse=True)
+        leaderboard = await self.donation_leaderboards.get(ctx.guild)
+        ordered_data = leaderboard.top(amt, keep=ctx.guild.get_member)
 
         if len(ordered_data) == 0:
             return await ctx.send("I have no data for your server")
@@ -1920,30 +2539,39 @@ class Giveaways(commands.Cog):
         await self.config.member(member).notes.set(notes)
         await ctx.send("Removed a note.")
 
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if before.roles != after.roles:
+            self.eligibility_cache.invalidate_member(after.guild.id, after.id)
+
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
-        channel = self.bot.get_channel(payload.channel_id)
-        user = channel.guild.get_member(payload.user_id)
-        if user.bot:
+        if payload.message_id not in self.active_ids or payload.guild_id is None:
             return
-        data = await self.config.guild(channel.guild).all()
-        gaws = data["giveaways"]
-        if str(payload.message_id) not in gaws:
+        info = self.active_giveaways.get(str(payload.message_id))
+        channel = self.bot.get_channel(payload.channel_id)
+        if not info or not channel:
             return
-        elif gaws[str(payload.message_id)]["Ongoing"] == False:
+        user = payload.member or channel.guild.get_member(payload.user_id)
+        if not user or user.bot:
             return
+        data = await self.get_guild_settings(channel.guild)
 
-        if not channel.permissions_for(channel.guild.me).manage_messages:
+        if str(payload.emoji) != data["emoji"]:
             return
 
-        if str(payload.emoji) != data["emoji"]:
+        ledger = self.entrants.get(str(payload.message_id))
+        if ledger is not None:
+            ledger.add(user.id)
+
+        if not channel.permissions_for(channel.guild.me).manage_messages:
             return
 
         bypassrole = data["bypassrole"]
         if bypassrole in [r.id for r in user.roles]:
             return
 
-        can_join = await self.can_join(user, gaws[str(payload.message_id)])
+        can_join = await self.can_join(user, info)
         if can_join == True:
             return
         else:
@@ -1961,4 +2589,50 @@ class Giveaways(commands.Cog):
                 ),
             )
             await user.send(embed=e)
-        
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # a new session (not a resume) misses the reactions made while the old
+        # one was down, so the ledgers can't be trusted at end time anymore
+        self.synced.clear()
+
+    @commands.Cog.listener()
+    async def on_shard_ready(self, shard_id):
+        self.synced.clear()
+
+    @commands.Cog.listener()
+    async def on_invite_delete(self, invite):
+        if invite.guild:
+            self.invite_cache.discard(invite.guild.id, invite.code)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        if payload.message_id not in self.active_ids:
+            return
+        ledger = self.entrants.get(str(payload.message_id))
+        if ledger is None or payload.user_id not in ledger:
+            return
+        guild = self.bot.get_guild(payload.guild_id)
+        if not guild:
+            return
+        if str(payload.emoji) == (await self.get_guild_settings(guild))["emoji"]:
+            ledger.discard(payload.user_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear(self, payload):
+        if payload.message_id not in self.active_ids:
+            return
+        ledger = self.entrants.get(str(payload.message_id))
+        if ledger is not None:
+            ledger.clear()
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload):
+        if payload.message_id not in self.active_ids:
+            return
+        ledger = self.entrants.get(str(payload.message_id))
+        if ledger is None:
+            return
+        guild = self.bot.get_guild(payload.guild_id)
+        if guild and str(payload.emoji) == (await self.get_guild_settings(guild))["emoji"]:
+            ledger.clear()
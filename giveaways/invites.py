@@ -0,0 +1,66 @@
+import asyncio
+import discord
+import time
+
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+
+class InviteCache:
+    """One reusable invite per guild for server join requirements
+
+    Invites are kept for ``ttl`` seconds, after that the old one is checked
+    with ``validate`` and only replaced through ``create`` if it stopped
+    working. Guilds where no invite could be made are retried after
+    ``retry_after`` seconds instead of on every render.
+    """
+
+    def __init__(
+        self,
+        create: Callable[[discord.Guild], Awaitable[Optional[str]]],
+        validate: Callable[[discord.Guild, str], Awaitable[bool]],
+        ttl: int = 3600,
+        retry_after: int = 300,
+    ):
+        self._create = create
+        self._validate = validate
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._entries: Dict[int, Tuple[Optional[str], float]] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self.stats = {"hits": 0, "created": 0, "validated": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, guild: discord.Guild) -> Optional[str]:
+        entry = self._entries.get(guild.id)
+        if entry and entry[1] > time.monotonic():
+            self.stats["hits"] += 1
+            return entry[0]
+
+        # renders and failed joins for the same guild can ask at once, only
+        # the first one should end up making an invite
+        async with self._locks.setdefault(guild.id, asyncio.Lock()):
+            entry = self._entries.get(guild.id)
+            if entry and entry[1] > time.monotonic():
+                self.stats["hits"] += 1
+                return entry[0]
+
+            url = entry[0] if entry else None
+            if url:
+                self.stats["validated"] += 1
+                if not await self._validate(guild, url):
+                    url = None
+            if not url:
+                self.stats["created"] += 1
+                url = await self._create(guild)
+
+            ttl = self.ttl if url else self.retry_after
+            self._entries[guild.id] = (url, time.monotonic() + ttl)
+            return url
+
+    def discard(self, guild_id: int, code: Optional[str] = None) -> None:
+        """Forget a guilds invite, only if it is ``code`` when that is given"""
+        entry = self._entries.get(guild_id)
+        if entry and (code is None or (entry[0] and entry[0].endswith(f"/{code}"))):
+            del self._entries[guild_id]
@@ -0,0 +1,122 @@
+import asyncio
+import discord
+import logging
+import time
+
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+log = logging.getLogger("red.andycogs.giveaways")
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """How long until a token is available"""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self._refill()
+        self.tokens -= 1
+
+
+class EditQueue:
+    """Queues giveaway message edits per channel and sends them through a token bucket
+
+    Discord limits how fast messages in one channel can be edited, so each
+    channel gets its own bucket and a worker that drains that channel's queue.
+    Queueing an edit for a message that already has one waiting just replaces
+    the waiting one, so only the latest render is ever sent. ``on_sent`` is
+    called once an edit actually went through.
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: int = 5,
+        on_not_found: Optional[Callable[[discord.Message], Awaitable[None]]] = None,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.on_not_found = on_not_found
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._queues: Dict[int, Deque[int]] = {}
+        self._pending: Dict[
+            int, Tuple[discord.Message, dict, Optional[Callable[[], None]]]
+        ] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self.stats = {"sent": 0, "skipped": 0, "deferred": 0}
+
+    def submit(
+        self,
+        message: discord.Message,
+        on_sent: Optional[Callable[[], None]] = None,
+        **kwargs,
+    ) -> None:
+        channel_id = message.channel.id
+        if message.id in self._pending:
+            self._pending[message.id] = (message, kwargs, on_sent)
+            self.stats["skipped"] += 1
+        else:
+            self._pending[message.id] = (message, kwargs, on_sent)
+            self._queues.setdefault(channel_id, deque()).append(message.id)
+        worker = self._workers.get(channel_id)
+        if channel_id in self._queues and (worker is None or worker.done()):
+            self._workers[channel_id] = asyncio.create_task(self._drain(channel_id))
+
+    async def _drain(self, channel_id: int) -> None:
+        bucket = self._buckets.setdefault(channel_id, TokenBucket(self.rate, self.burst))
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                delay = bucket.delay()
+                if delay:
+                    self.stats["deferred"] += 1
+                    await asyncio.sleep(delay)
+                message_id = queue.popleft()
+                if message_id not in self._pending:
+                    continue  # discarded while it was waiting
+                message, kwargs, on_sent = self._pending.pop(message_id)
+                bucket.take()
+                try:
+                    await message.edit(**kwargs)
+                    self.stats["sent"] += 1
+                    if on_sent:
+                        on_sent()
+                except discord.NotFound:
+                    if self.on_not_found:
+                        await self.on_not_found(message)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    # HTTP errors but also timeouts and dropped connections,
+                    # none of which may take the rest of the channel down
+                    log.exception("Couldn't edit giveaway message %s", message_id)
+        finally:
+            self._workers.pop(channel_id, None)
+            if not queue:
+                self._queues.pop(channel_id, None)
+
+    def discard(self, message_id: int) -> None:
+        """Drop a waiting edit, used when the giveaway ends before it is sent"""
+        self._pending.pop(message_id, None)
+
+    def stop(self) -> None:
+        for worker in self._workers.values():
+            worker.cancel()
+        self._workers.clear()
+        self._queues.clear()
+        self._pending.clear()
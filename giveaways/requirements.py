@@ -0,0 +1,108 @@
+import time
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Set, Tuple
+
+# numeric requirements in the order they get checked, local and Config
+# lookups first so MEE6/Amari are only asked about members that got that far
+CHECK_ORDER = ("joindays", "shared", "invites", "mee6", "amari", "weeklyamari")
+
+REQUIREMENT_MESSAGES = {
+    "joindays": "You need to be in the server for {0} more days to enter [JUMP_URL_HERE] giveaway",
+    "shared": "You need to share {0} more coins in this server to join [JUMP_URL_HERE] giveaway",
+    "invites": "You need to have {0} more invites to join [JUMP_URL_HERE] giveaway",
+    "mee6": "You need {0} more MEE6 levels to enter [JUMP_URL_HERE] giveaway",
+    "amari": "You need {0} more Amari levels to enter [JUMP_URL_HERE] giveaway",
+    "weeklyamari": "You need {0} more weekly amari points to enter [JUMP_URL_HERE] giveaway",
+}
+
+
+class RequirementChain:
+    """A giveaways requirements compiled once into what can_join checks against"""
+
+    __slots__ = ("key", "roles", "thresholds", "server")
+
+    def __init__(self, requirements: dict):
+        self.key = self.key_for(requirements)
+        self.roles = frozenset(int(r) for r in requirements.get("roles") or ())
+        self.thresholds: List[Tuple[str, int]] = [
+            (name, requirements[name])
+            for name in CHECK_ORDER
+            if requirements.get(name)
+        ]
+        self.server = requirements.get("server")
+
+    @staticmethod
+    def key_for(requirements: dict) -> Hashable:
+        return tuple(
+            (name, tuple(value) if isinstance(value, list) else value)
+            for name, value in sorted(requirements.items())
+        )
+
+
+class EligibilityCache:
+    """Bounded LRU of can_join verdicts with a TTL
+
+    Verdicts are keyed on (guild, member, requirements) so giveaways with the
+    same requirements share them. The TTL covers the values nothing tells us
+    about changing (MEE6/Amari levels, invites, shares), role changes and
+    settings changes invalidate entries straight away.
+    """
+
+    def __init__(self, maxsize: int = 50_000, ttl: int = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._members: Dict[Tuple[int, int], Set[Hashable]] = {}
+        self._generations: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, guild_id: int, member_id: int, requirements_key: Hashable):
+        key = (guild_id, member_id, requirements_key)
+        entry = self._data.get(key)
+        if (
+            entry is None
+            or entry[0] < time.monotonic()
+            or entry[1] != self._generations.get(guild_id, 0)
+        ):
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def set(self, guild_id: int, member_id: int, requirements_key: Hashable, verdict):
+        key = (guild_id, member_id, requirements_key)
+        self._data[key] = (
+            time.monotonic() + self.ttl,
+            self._generations.get(guild_id, 0),
+            verdict,
+        )
+        self._data.move_to_end(key)
+        self._members.setdefault((guild_id, member_id), set()).add(key)
+        while len(self._data) > self.maxsize:
+            old_key, _ = self._data.popitem(last=False)
+            self._forget(old_key)
+
+    def _forget(self, key):
+        keys = self._members.get(key[:2])
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self._members[key[:2]]
+
+    def invalidate_member(self, guild_id: int, member_id: int) -> None:
+        for key in self._members.pop((guild_id, member_id), ()):
+            self._data.pop(key, None)
+
+    def invalidate_guild(self, guild_id: int) -> None:
+        self._generations[guild_id] = self._generations.get(guild_id, 0) + 1
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._members.clear()
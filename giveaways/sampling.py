@@ -0,0 +1,51 @@
+import heapq
+import math
+import random
+
+from itertools import count
+from typing import Any, Hashable, Iterable, List, Optional, Tuple
+
+
+class WeightedReservoir:
+    """Weighted random sampling without replacement (Efraimidis & Spirakis, A-Res)
+
+    Every item gets the key ``u ** (1 / weight)`` for a uniform ``u`` and the
+    ``k`` items with the largest keys are the sample. Only those ``k`` are kept
+    in a heap, so items can be streamed in as they are found in O(n log k) and
+    the result always has exactly ``min(k, items added)`` items, no item is
+    picked twice.
+    """
+
+    def __init__(self, k: int, rng: Optional[random.Random] = None):
+        self.k = k
+        self._rng = rng or random.SystemRandom()
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._counter = count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def add(self, item: Hashable, weight: float) -> None:
+        if weight <= 0 or self.k <= 0:
+            return
+        # log(u) / weight orders the same as u ** (1 / weight) but doesn't
+        # underflow for big weights. 1 - random() keeps u out of 0
+        key = math.log(1.0 - self._rng.random()) / weight
+        entry = (key, next(self._counter), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif key > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def result(self) -> List[Any]:
+        """The sampled items, in the order they were drawn"""
+        return [item for _, _, item in sorted(self._heap, reverse=True)]
+
+
+def weighted_sample(
+    pairs: Iterable[Tuple[Hashable, float]], k: int, rng: Optional[random.Random] = None
+) -> List[Any]:
+    reservoir = WeightedReservoir(k, rng)
+    for item, weight in pairs:
+        reservoir.add(item, weight)
+    return reservoir.result()
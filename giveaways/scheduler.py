@@ -0,0 +1,167 @@
+import asyncio
+import heapq
+import logging
+
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+log = logging.getLogger("red.andycogs.giveaways")
+
+REFRESH = "refresh"
+END = "end"
+
+
+def utc_timestamp() -> float:
+    # giveaway endtimes are stored as datetime.utcnow().timestamp(), so the
+    # scheduler has to use the same clock to compare against them
+    return datetime.utcnow().timestamp()
+
+
+class GiveawayScheduler:
+    """One task that owns the next refresh/end deadline of every giveaway.
+
+    Deadlines live in a heap keyed on the time they are due. Each giveaway has
+    at most one live refresh and one live end entry, rescheduling or
+    cancelling just invalidates the old heap entry which gets skipped once it
+    reaches the top.
+    Refreshes run through a semaphore so only ``max_edits`` message edits are
+    in flight at once, ends are dispatched right at their deadline. A refresh
+    that raises is retried after ``retry_after`` seconds, doubling up to
+    ``max_retry_after``, for as long as the giveaway still has an end entry.
+    An end that raises is retried the same way unless the giveaway was
+    cancelled (which ending it does) while it ran.
+    """
+
+    def __init__(
+        self,
+        refresh: Callable[[str], Awaitable[None]],
+        end: Callable[[str], Awaitable[None]],
+        max_edits: int = 5,
+        clock: Callable[[], float] = utc_timestamp,
+        retry_after: float = 30,
+        max_retry_after: float = 600,
+    ):
+        self._callbacks = {REFRESH: refresh, END: end}
+        self._clock = clock
+        self._heap: List[Tuple[float, int, str, str]] = []
+        self._entries: Dict[Tuple[str, str], int] = {}
+        self._failures: Dict[Tuple[str, str], int] = {}
+        self._ending: Set[str] = set()
+        self._counter = 0
+        self._wakeup = asyncio.Event()
+        self._edit_semaphore = asyncio.Semaphore(max_edits)
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.max_edits = max_edits
+        self.retry_after = retry_after
+        self.max_retry_after = max_retry_after
+        self.in_flight = 0
+        self.wakeups = 0
+        self.dispatched = 0
+
+    def __len__(self):
+        return len({key for key, _ in self._entries})
+
+    def __contains__(self, key: str):
+        return (key, REFRESH) in self._entries or (key, END) in self._entries
+
+    def schedule(self, key: str, deadline: float, kind: str = REFRESH) -> None:
+        """Schedule (or reschedule) a giveaway, replacing its previous deadline of that kind"""
+        self._counter += 1
+        self._entries[key, kind] = self._counter
+        heapq.heappush(self._heap, (deadline, self._counter, key, kind))
+
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._compact()
+        if self._heap[0][1] == self._counter:
+            # new earliest deadline, the runner needs to shorten its sleep
+            self._wakeup.set()
+
+    def cancel(self, key: str) -> None:
+        self._entries.pop((key, REFRESH), None)
+        self._entries.pop((key, END), None)
+        self._failures.pop((key, REFRESH), None)
+        self._failures.pop((key, END), None)
+        self._ending.discard(key)
+
+    def next_deadline(self) -> Optional[float]:
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def _compact(self):
+        self._heap = [e for e in self._heap if self._entries.get((e[2], e[3])) == e[1]]
+        heapq.heapify(self._heap)
+
+    def _discard_stale(self):
+        while self._heap:
+            _, counter, key, kind = self._heap[0]
+            if self._entries.get((key, kind)) == counter:
+                break
+            heapq.heappop(self._heap)
+
+    def pop_due(self, now: float) -> List[Tuple[str, str]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, counter, key, kind = heapq.heappop(self._heap)
+            if self._entries.get((key, kind)) != counter:
+                continue
+            del self._entries[key, kind]
+            due.append((key, kind))
+        return due
+
+    async def run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            for key, kind in self.pop_due(self._clock()):
+                task = asyncio.create_task(self._dispatch(key, kind))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else max(deadline - self._clock(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeups += 1
+
+    async def _dispatch(self, key: str, kind: str) -> None:
+        self.dispatched += 1
+        try:
+            if kind == END:
+                self._ending.add(key)
+                await self._callbacks[END](key)
+            else:
+                async with self._edit_semaphore:
+                    self.in_flight += 1
+                    try:
+                        await self._callbacks[REFRESH](key)
+                    finally:
+                        self.in_flight -= 1
+            self._failures.pop((key, kind), None)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Error while running the %s for giveaway %s", kind, key)
+            if kind == END and key in self._ending:
+                self._retry(key, END)
+            elif kind == REFRESH and (key, END) in self._entries:
+                self._retry(key, REFRESH)
+        finally:
+            if kind == END:
+                self._ending.discard(key)
+
+    def _retry(self, key: str, kind: str) -> None:
+        failures = self._failures.get((key, kind), 0)
+        self._failures[key, kind] = failures + 1
+        delay = min(self.retry_after * 2 ** failures, self.max_retry_after)
+        self.schedule(key, self._clock() + delay, kind)
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        self._entries.clear()
+        self._failures.clear()
+        self._ending.clear()
+        self._heap.clear()
@@ -8,6 +8,8 @@ from redbot.core.utils.chat_formatting import pagify, box
 from redbot.core.utils.menus import menu, DEFAULT_CONTROLS
 from typing import Optional, Union
 
+from .leaderboard import LeaderboardIndex
+
 INVITE_MESSAGE_USAGE = """
 Sets your servers join/leave message. Variables:
 {inviter}: Mentions the inviter
@@ -52,6 +54,7 @@ class InviteTracker(commands.Cog):
         self.config.register_member(**default_member)
         self.config.register_guild(**default_guild)
 
+        self.invite_leaderboards = LeaderboardIndex(self.load_invites)
         self.invite_task = asyncio.create_task(self.invite_loop())
 
     async def invite_loop(self):
@@ -63,6 +66,12 @@ class InviteTracker(commands.Cog):
             await self.save_invite_links(guild)
         await asyncio.sleep(300)
 
+    async def load_invites(self, guild: discord.Guild) -> dict:
+        return {
+            int(member_id): data["invites"]
+            for member_id, data in (await self.config.all_members(guild)).items()
+        }
+
     async def add_invite_roles(self, guild: discord.Guild, member: discord.Member):
         invite_roles = await self.config.guild(guild).roles()
         member_roles = member.roles
@@ -285,15 +294,10 @@ class InviteTracker(commands.Cog):
         self, ctx, amount: Optional[int] = 10, top_to_bottom: Optional[bool] = True
     ):
         """View the top/bottom inviters"""
-        all_members = await self.config.all_members(ctx.guild)
-        member_data = [
-            (member, data["invites"])
-            for member, data in all_members.items()
-            if data["invites"] > 0 and ctx.guild.get_member(int(member)) is not None
-        ]
-        sorted_data = sorted(member_data, key=lambda k: k[1], reverse=top_to_bottom)[
-            :amount
-        ]
+        leaderboard = await self.invite_leaderboards.get(ctx.guild)
+        sorted_data = leaderboard.top(
+            amount, keep=ctx.guild.get_member, reverse=not top_to_bottom
+        )
 
         leaderboard = ""
 
@@ -400,6 +404,7 @@ class InviteTracker(commands.Cog):
             invites = await self.config.member_from_ids(guild.id, inviter.id).invites()
             invites += 1
             await self.config.member_from_ids(guild.id, inviter.id).invites.set(invites)
+            self.invite_leaderboards.update(guild.id, inviter.id, invites)
             if not channel:
                 return
             message = await self.config.guild(member.guild).joinmessage()
@@ -452,6 +457,7 @@ class InviteTracker(commands.Cog):
             invites = await self.config.member_from_ids(guild.id, inviter).invites()
             invites -= 1
             await self.config.member_from_ids(guild.id, inviter).invites.set(invites)
+            self.invite_leaderboards.update(guild.id, inviter, invites)
             if not channel:
                 return
             message = await self.config.guild(member.guild).leavemessage()
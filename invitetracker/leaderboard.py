@@ -0,0 +1,176 @@
+import asyncio
+
+from bisect import bisect_left, insort
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+class Leaderboard:
+    """Member ids ordered by score, highest first
+
+    Entries are kept as ``(-score, member_id)`` in a list of sorted blocks of
+    at most ``2 * load`` entries, so an update is a bisect over the block
+    maxes plus one inside a small block instead of a shift of the whole list.
+    Only positive scores are kept since those are all a leaderboard shows.
+    """
+
+    def __init__(self, scores: Optional[Dict[int, int]] = None, load: int = 512):
+        self.load = load
+        self._scores: Dict[int, int] = {}
+        self._blocks: List[List[Tuple[int, int]]] = []
+        self._maxes: List[Tuple[int, int]] = []
+        if scores:
+            self._scores = {m: s for m, s in scores.items() if s > 0}
+            entries = sorted((-s, m) for m, s in self._scores.items())
+            self._blocks = [
+                entries[i : i + load] for i in range(0, len(entries), load)
+            ]
+            self._maxes = [block[-1] for block in self._blocks]
+
+    def __len__(self):
+        return len(self._scores)
+
+    def score(self, member_id: int) -> int:
+        return self._scores.get(member_id, 0)
+
+    def update(self, member_id: int, score: int) -> None:
+        old = self._scores.pop(member_id, None)
+        if old is not None:
+            self._remove((-old, member_id))
+        if score > 0:
+            self._scores[member_id] = score
+            self._insert((-score, member_id))
+
+    def _insert(self, entry: Tuple[int, int]) -> None:
+        if not self._blocks:
+            self._blocks.append([entry])
+            self._maxes.append(entry)
+            return
+
+        i = bisect_left(self._maxes, entry)
+        if i == len(self._maxes):
+            i -= 1
+            self._blocks[i].append(entry)
+            self._maxes[i] = entry
+        else:
+            insort(self._blocks[i], entry)
+
+        block = self._blocks[i]
+        if len(block) > 2 * self.load:
+            half = block[self.load :]
+            del block[self.load :]
+            self._maxes[i] = block[-1]
+            self._blocks.insert(i + 1, half)
+            self._maxes.insert(i + 1, half[-1])
+
+    def _remove(self, entry: Tuple[int, int]) -> None:
+        i = bisect_left(self._maxes, entry)
+        if i == len(self._maxes):
+            return
+        block = self._blocks[i]
+        j = bisect_left(block, entry)
+        if j == len(block) or block[j] != entry:
+            return
+        del block[j]
+        if block:
+            self._maxes[i] = block[-1]
+        else:
+            del self._blocks[i]
+            del self._maxes[i]
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        for block in self._blocks:
+            for score, member_id in block:
+                yield member_id, -score
+
+    def __reversed__(self) -> Iterator[Tuple[int, int]]:
+        for block in reversed(self._blocks):
+            for score, member_id in reversed(block):
+                yield member_id, -score
+
+    def top(
+        self,
+        amount: int,
+        keep: Optional[Callable[[int], object]] = None,
+        reverse: bool = False,
+    ) -> List[Tuple[int, int]]:
+        """The first ``amount`` (member_id, score) pairs that ``keep`` doesn't reject"""
+        result = []
+        if amount < 1:
+            return result
+        for member_id, score in reversed(self) if reverse else self:
+            if keep is not None and not keep(member_id):
+                continue
+            result.append((member_id, score))
+            if len(result) >= amount:
+                break
+        return result
+
+
+class LeaderboardIndex:
+    """A Leaderboard per guild, loaded from Config the first time it's needed
+
+    Updates for a guild whose leaderboard isn't loaded are dropped since the
+    load reads the stored scores anyway, updates made while a load is running
+    are applied in order on top of what it read.
+    """
+
+    def __init__(self, load: Callable[..., Awaitable[Dict[int, int]]]):
+        self._load = load
+        self._boards: Dict[int, Leaderboard] = {}
+        self._loading: Dict[int, asyncio.Future] = {}
+        self._pending: Dict[int, List[Tuple[int, int, bool]]] = {}
+
+    async def get(self, guild) -> Leaderboard:
+        board = self._boards.get(guild.id)
+        if board is not None:
+            return board
+        if guild.id in self._loading:
+            return await asyncio.shield(self._loading[guild.id])
+
+        future = self._loading[guild.id] = asyncio.get_event_loop().create_future()
+        self._pending[guild.id] = []
+        try:
+            board = Leaderboard(await self._load(guild))
+            for member_id, value, relative in self._pending[guild.id]:
+                board.update(member_id, board.score(member_id) + value if relative else value)
+            self._boards[guild.id] = board
+            future.set_result(board)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._loading[guild.id]
+            del self._pending[guild.id]
+        return board
+
+    def update(self, guild_id: int, member_id: int, score: int) -> None:
+        board = self._boards.get(guild_id)
+        if board is not None:
+            board.update(member_id, score)
+        elif guild_id in self._pending:
+            self._pending[guild_id].append((member_id, score, False))
+
+    def add(self, guild_id: int, member_id: int, amount: int) -> None:
+        board = self._boards.get(guild_id)
+        if board is not None:
+            board.update(member_id, board.score(member_id) + amount)
+        elif guild_id in self._pending:
+            self._pending[guild_id].append((member_id, amount, True))
+
+    def reset_pending(self, guild_id: int) -> None:
+        """Drop the updates queued for a loading guild
+
+        For loads whose snapshot already has every update made so far, so only
+        the ones from here on are applied on top of it.
+        """
+        if guild_id in self._pending:
+            self._pending[guild_id].clear()
+
+    def clear(self, guild_id: Optional[int] = None) -> None:
+        if guild_id is None:
+            self._boards.clear()
+        else:
+            self._boards.pop(guild_id, None)